@@ -0,0 +1,510 @@
+"""SQLite-backed stand-in for PostgREST (and the LLM chat endpoint).
+
+Implements the subset of the PostgREST HTTP API that the app's models use
+through ``supabase-py``: column selection, horizontal filters (eq, neq, gt,
+gte, lt, lte, is, like, ilike, in, or=(...)), ordering, limit/offset, exact
+counts, insert/upsert, update, delete and ``/rpc`` calls. Point the app at it
+by setting ``SUPABASE_URL`` to the server's base URL.
+
+It also answers OpenAI-style ``/llm/chat/completions`` requests with canned
+responses after a configurable delay, so LLM routes can be load-tested
+offline by setting ``LLM_ENDPOINT``.
+
+Usage:
+    python -m bench.fake_postgrest --port 54321 --seed 1000
+"""
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wrappers import Request, Response
+
+# SQLite translation of the Supabase schema in SUPABASE_MIGRATION.md
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username VARCHAR(80) UNIQUE NOT NULL,
+  email VARCHAR(120) UNIQUE NOT NULL,
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE TABLE IF NOT EXISTS notes (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+  title VARCHAR(200) NOT NULL,
+  content TEXT NOT NULL,
+  "order" INTEGER NOT NULL DEFAULT 0,
+  tags TEXT,
+  event_date VARCHAR(50),
+  event_time VARCHAR(50),
+  event_at TEXT,
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  sync_seq INTEGER,
+  sync_txid INTEGER
+);
+CREATE INDEX IF NOT EXISTS notes_user_order_idx ON notes (user_id, "order" DESC, updated_at DESC);
+CREATE INDEX IF NOT EXISTS notes_user_sync_txid_idx ON notes (user_id, sync_txid);
+CREATE INDEX IF NOT EXISTS notes_user_event_at_idx ON notes (user_id, event_at) WHERE event_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS note_tombstones (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  note_id INTEGER NOT NULL,
+  user_id INTEGER,
+  deleted_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  sync_seq INTEGER,
+  sync_txid INTEGER
+);
+CREATE INDEX IF NOT EXISTS note_tombstones_user_sync_txid_idx ON note_tombstones (user_id, sync_txid);
+-- Stands in for the note_sync_seq sequence and its trigger. SQLite runs one
+-- write at a time, so the sequence value doubles as the transaction id.
+CREATE TABLE IF NOT EXISTS note_sync_seq (last_value INTEGER NOT NULL);
+INSERT INTO note_sync_seq SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM note_sync_seq);
+CREATE TRIGGER IF NOT EXISTS notes_sync_seq_insert AFTER INSERT ON notes BEGIN
+  UPDATE note_sync_seq SET last_value = last_value + 1;
+  UPDATE notes SET (sync_seq, sync_txid) = (SELECT last_value, last_value FROM note_sync_seq) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS notes_sync_seq_update AFTER UPDATE ON notes
+WHEN NEW.sync_seq IS OLD.sync_seq BEGIN
+  UPDATE note_sync_seq SET last_value = last_value + 1;
+  UPDATE notes SET (sync_seq, sync_txid) = (SELECT last_value, last_value FROM note_sync_seq) WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS note_tombstones_sync_seq AFTER INSERT ON note_tombstones BEGIN
+  UPDATE note_sync_seq SET last_value = last_value + 1;
+  UPDATE note_tombstones SET (sync_seq, sync_txid) = (SELECT last_value, last_value FROM note_sync_seq) WHERE id = NEW.id;
+END;
+CREATE TABLE IF NOT EXISTS note_revisions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+  revision INTEGER NOT NULL,
+  kind VARCHAR(10) NOT NULL,
+  data TEXT NOT NULL,
+  created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  UNIQUE (note_id, revision)
+);
+CREATE TABLE IF NOT EXISTS note_tags (
+  note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+  user_id INTEGER,
+  tag VARCHAR(100) NOT NULL,
+  PRIMARY KEY (note_id, tag)
+);
+CREATE INDEX IF NOT EXISTS note_tags_user_tag_idx ON note_tags (user_id, tag);
+CREATE VIEW IF NOT EXISTS tag_counts AS
+  SELECT user_id, tag, count(*) AS count FROM note_tags GROUP BY user_id, tag;
+CREATE TABLE IF NOT EXISTS note_order_counters (
+  user_id INTEGER PRIMARY KEY,
+  last_order INTEGER NOT NULL
+);
+'''
+
+OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=',
+             'like': 'LIKE', 'ilike': 'LIKE'}
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'or', 'columns'}
+
+WORDS = ('meeting project badminton lecture deadline groceries travel budget review design '
+         'exam library coffee doctor gym report sprint release invoice birthday').split()
+
+
+class PostgrestError(Exception):
+    def __init__(self, message, status=400, code='PGRST100'):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def quote(name):
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+        raise PostgrestError(f'invalid identifier {name!r}')
+    return f'"{name}"'
+
+
+def _split_top_level(text):
+    """Split on commas that are not nested inside parentheses or double quotes"""
+    parts, depth, current = [], 0, ''
+    quoted = escaped = False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif quoted and char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif quoted:
+            pass
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _condition(column, expression):
+    """Translate a PostgREST ``op.value`` expression into SQL and parameters"""
+    negate = False
+    if expression.startswith('not.'):
+        negate, expression = True, expression[4:]
+    operator, _, value = expression.partition('.')
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = re.sub(r'\\(.)', r'\1', value[1:-1])
+    column_sql = quote(column)
+    if operator == 'is':
+        literal = {'null': 'NULL', 'true': '1', 'false': '0'}.get(value.lower())
+        if literal is None:
+            raise PostgrestError(f'invalid is value {value!r}')
+        sql, params = f'{column_sql} IS {literal}', []
+    elif operator == 'in':
+        values = [v.strip().strip('"') for v in value.strip('()').split(',') if v.strip()]
+        if not values:
+            sql, params = '0', []
+        else:
+            sql, params = f'{column_sql} IN ({",".join("?" * len(values))})', values
+    elif operator in OPERATORS:
+        if operator in ('like', 'ilike'):
+            # Postgres patterns escape wildcards with a backslash by default
+            sql, params = f"{column_sql} LIKE ? ESCAPE '\\'", [value.replace('*', '%')]
+        else:
+            sql, params = f'{column_sql} {OPERATORS[operator]} ?', [value]
+    else:
+        raise PostgrestError(f'unsupported operator {operator!r}')
+    if negate:
+        sql = f'NOT ({sql})'
+    return sql, params
+
+
+def _or_condition(expression):
+    """Translate ``(col.op.value,col.op.value)`` into an OR group"""
+    parts, params = [], []
+    for item in _split_top_level(expression.strip()[1:-1]):
+        column, _, rest = item.partition('.')
+        sql, item_params = _condition(column, rest)
+        parts.append(sql)
+        params.extend(item_params)
+    return '(' + ' OR '.join(parts) + ')', params
+
+
+class FakePostgrest:
+    """WSGI application serving a SQLite database with PostgREST semantics"""
+
+    def __init__(self, path=':memory:', llm_latency=0.0):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+        self.conn.create_function('md5', 1, lambda text: hashlib.md5(str(text).encode()).hexdigest())
+        self.lock = threading.Lock()
+        self.llm_latency = llm_latency
+        self.rpcs = {
+            'notes_checksum': _checksum_rpc(
+                "SELECT id || ':' || md5(title || char(31) || content) FROM notes ORDER BY id"),
+            'users_checksum': _checksum_rpc(
+                "SELECT username || ':' || md5(email) FROM users ORDER BY username"),
+            'next_note_order': _next_note_order_rpc,
+            'update_notes': _update_notes_rpc,
+            'note_revision_heads': _note_revision_heads_rpc,
+            'note_sync_horizon': _note_sync_horizon_rpc,
+        }
+
+    # -- data helpers ------------------------------------------------------
+
+    def reset(self):
+        with self.lock:
+            tables = [row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                self.conn.execute(f'DELETE FROM {quote(table)}')
+            self.conn.execute("DELETE FROM sqlite_sequence")
+            self.conn.execute("INSERT INTO note_sync_seq VALUES (0)")
+            self.conn.commit()
+
+    def seed_notes(self, count, batch_size=5000):
+        """Insert ``count`` synthetic notes with realistic titles/content"""
+        now = datetime.utcnow()
+        with self.lock:
+            for start in range(0, count, batch_size):
+                rows = []
+                for i in range(start, min(start + batch_size, count)):
+                    words = [WORDS[(i * 7 + k * 3) % len(WORDS)] for k in range(40)]
+                    stamp = (now - timedelta(seconds=count - i)).isoformat()
+                    # Every tenth note is an event, spread over the past and next year
+                    event = (now + timedelta(days=i * 37 % 730 - 365)).date().isoformat() if i % 10 == 0 else None
+                    rows.append((f'{WORDS[i % len(WORDS)].title()} note {i}', ' '.join(words), i + 1,
+                                 json.dumps([WORDS[i % len(WORDS)], WORDS[(i + 5) % len(WORDS)]]),
+                                 event, '09:00' if event else None, f'{event}T09:00:00' if event else None,
+                                 stamp, stamp))
+                self.conn.executemany(
+                    'INSERT INTO notes (title, content, "order", tags, event_date, event_time, event_at, '
+                    'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            # Same backfill as SUPABASE_MIGRATION.md does for existing notes
+            self.conn.execute(
+                'INSERT OR IGNORE INTO note_tags (note_id, user_id, tag) '
+                'SELECT notes.id, notes.user_id, tag.value FROM notes, json_each(notes.tags) AS tag '
+                'WHERE notes.tags IS NOT NULL')
+            self.conn.commit()
+
+    # -- WSGI --------------------------------------------------------------
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        try:
+            if request.path.startswith('/llm/'):
+                response = self.chat_completion(request)
+            elif request.path.startswith('/rest/v1/rpc/'):
+                response = self.rpc(request, request.path[len('/rest/v1/rpc/'):])
+            elif request.path.startswith('/rest/v1/'):
+                response = self.table(request, request.path[len('/rest/v1/'):])
+            else:
+                response = Response(status=404)
+        except PostgrestError as e:
+            response = self.error(str(e), e.status, e.code)
+        except sqlite3.IntegrityError as e:
+            response = self.error(str(e), 409, '23505')
+        except sqlite3.Error as e:
+            response = self.error(str(e), 400, '42000')
+        return response(environ, start_response)
+
+    @staticmethod
+    def error(message, status, code):
+        body = json.dumps({'message': message, 'code': code, 'details': None, 'hint': None})
+        return Response(body, status=status, mimetype='application/json')
+
+    def table(self, request, table):
+        quote(table)
+        prefer = request.headers.get('Prefer', '')
+        if request.method in ('GET', 'HEAD'):
+            rows, total = self.select(table, request.args, 'count=exact' in prefer)
+            response = Response('' if request.method == 'HEAD' else json.dumps(rows), mimetype='application/json')
+            if total is not None:
+                end = max(len(rows) - 1, 0)
+                response.headers['Content-Range'] = f'0-{end}/{total}' if rows else f'*/{total}'
+            return response
+        if request.method == 'POST':
+            rows = self.insert(table, request.get_json(), request.args.get('on_conflict'), prefer)
+        elif request.method == 'PATCH':
+            rows = self.update(table, request.get_json(), request.args)
+        elif request.method == 'DELETE':
+            rows = self.delete(table, request.args)
+        else:
+            return Response(status=405)
+        status = 201 if request.method == 'POST' else 200
+        if 'return=minimal' in prefer:
+            return Response(status=204 if status == 200 else status)
+        return Response(json.dumps(rows), status=status, mimetype='application/json')
+
+    def where(self, args):
+        clauses, params = [], []
+        for key, value in args.items(multi=True):
+            if key == 'or':
+                sql, values = _or_condition(value)
+            elif key in RESERVED_PARAMS:
+                continue
+            else:
+                sql, values = _condition(key, value)
+            clauses.append(sql)
+            params.extend(values)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def select(self, table, args, with_count=False):
+        columns = args.get('select', '*')
+        if columns.strip() == '*':
+            columns_sql = '*'
+        else:
+            columns_sql = ', '.join(quote(c.strip().strip('"')) for c in columns.split(','))
+        where, params = self.where(args)
+
+        order_sql = ''
+        orders = []
+        for order in args.getlist('order'):
+            for term in order.split(','):
+                parts = term.split('.')
+                direction = 'DESC' if 'desc' in parts[1:] else 'ASC'
+                nulls = ' NULLS FIRST' if 'nullsfirst' in parts[1:] else ''
+                orders.append(f'{quote(parts[0])} {direction}{nulls}')
+        if orders:
+            order_sql = ' ORDER BY ' + ', '.join(orders)
+
+        limit_sql = ''
+        if 'limit' in args:
+            limit_sql = f' LIMIT {int(args["limit"])}'
+            if 'offset' in args:
+                limit_sql += f' OFFSET {int(args["offset"])}'
+
+        with self.lock:
+            rows = [dict(row) for row in self.conn.execute(
+                f'SELECT {columns_sql} FROM {quote(table)}{where}{order_sql}{limit_sql}', params)]
+            total = None
+            if with_count:
+                total = self.conn.execute(f'SELECT COUNT(*) FROM {quote(table)}{where}', params).fetchone()[0]
+        return rows, total
+
+    def insert(self, table, payload, on_conflict, prefer):
+        rows = payload if isinstance(payload, list) else [payload]
+        if not rows:
+            return []
+        columns = sorted({key for row in rows for key in row})
+        column_sql = ', '.join(quote(c) for c in columns)
+        sql = f'INSERT INTO {quote(table)} ({column_sql}) VALUES ({", ".join("?" * len(columns))})'
+        if 'resolution=merge-duplicates' in prefer or 'resolution=ignore-duplicates' in prefer:
+            target = ', '.join(quote(c.strip()) for c in (on_conflict or 'id').split(','))
+            if 'resolution=ignore-duplicates' in prefer:
+                sql += f' ON CONFLICT ({target}) DO NOTHING'
+            else:
+                updates = ', '.join(f'{quote(c)} = excluded.{quote(c)}' for c in columns)
+                sql += f' ON CONFLICT ({target}) DO UPDATE SET {updates}'
+        sql += ' RETURNING *'
+        with self.lock:
+            result = []
+            for row in rows:
+                result.extend(dict(r) for r in self.conn.execute(sql, [_encode(row.get(c)) for c in columns]))
+            self.conn.commit()
+        return result
+
+    def update(self, table, payload, args):
+        columns = list(payload)
+        assignments = ', '.join(f'{quote(c)} = ?' for c in columns)
+        where, params = self.where(args)
+        with self.lock:
+            rows = [dict(r) for r in self.conn.execute(
+                f'UPDATE {quote(table)} SET {assignments}{where} RETURNING *',
+                [_encode(payload[c]) for c in columns] + params)]
+            self.conn.commit()
+        return rows
+
+    def delete(self, table, args):
+        where, params = self.where(args)
+        with self.lock:
+            rows = [dict(r) for r in self.conn.execute(f'DELETE FROM {quote(table)}{where} RETURNING *', params)]
+            self.conn.commit()
+        return rows
+
+    def rpc(self, request, name):
+        func = self.rpcs.get(name)
+        if func is None:
+            raise PostgrestError(f'Could not find the function public.{name}', 404, 'PGRST202')
+        with self.lock:
+            result = func(self.conn, request.get_json(silent=True) or {})
+            self.conn.commit()
+        return Response(json.dumps(result), mimetype='application/json')
+
+    def chat_completion(self, request):
+        """Minimal OpenAI chat completion: language detection or an echo translation"""
+        if self.llm_latency:
+            time.sleep(self.llm_latency)
+        payload = request.get_json() or {}
+        messages = payload.get('messages') or [{}]
+        prompt = messages[-1].get('content', '')
+        if 'What language' in prompt:
+            content = 'English'
+        else:
+            content = 'translated: ' + prompt.split(':', 1)[-1].strip()[:200]
+        body = {
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': payload.get('model', 'bench'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }
+        return Response(json.dumps(body), mimetype='application/json')
+
+
+def _checksum_rpc(query):
+    """Emulate the <table>_checksum() SQL functions from SUPABASE_MIGRATION.md"""
+    def rpc(conn, params):
+        parts = [row[0] for row in conn.execute(query)]
+        return [{'checksum': hashlib.md5(','.join(parts).encode()).hexdigest()}]
+    return rpc
+
+
+def _next_note_order_rpc(conn, params):
+    """Emulate the next_note_order() SQL function from SUPABASE_MIGRATION.md"""
+    user_id = params.get('p_user_id')
+    count = params.get('p_count', 1)
+    row = conn.execute('UPDATE note_order_counters SET last_order = last_order + ? '
+                       'WHERE user_id = ? RETURNING last_order', (count, user_id or 0)).fetchone()
+    if row is None:
+        scope = 'user_id IS NULL' if user_id is None else 'user_id = ?'
+        row = conn.execute(f'SELECT coalesce(max("order"), 0) + ? FROM notes WHERE {scope}',
+                           (count,) if user_id is None else (count, user_id)).fetchone()
+        conn.execute('INSERT INTO note_order_counters (user_id, last_order) VALUES (?, ?)', (user_id or 0, row[0]))
+    return [{'next_order': row[0]}]
+
+
+# Columns update_notes() may set
+NOTE_UPDATE_COLUMNS = ('title', 'content', 'order', 'tags', 'event_date', 'event_time', 'event_at', 'updated_at')
+
+
+def _update_notes_rpc(conn, params):
+    """Emulate the update_notes() SQL function from SUPABASE_MIGRATION.md"""
+    updated = []
+    for row in params.get('p_rows') or []:
+        columns = [column for column in NOTE_UPDATE_COLUMNS if column in row]
+        if not columns:
+            continue
+        assignments = ', '.join(f'{quote(column)} = ?' for column in columns)
+        values = [row[column] for column in columns] + [row['id'], row.get('user_id')]
+        cursor = conn.execute(f'UPDATE notes SET {assignments} WHERE id = ? AND user_id IS ? RETURNING *', values)
+        updated.extend(dict(r) for r in cursor)
+    return updated
+
+
+def _note_revision_heads_rpc(conn, params):
+    """Emulate the note_revision_heads() SQL function from SUPABASE_MIGRATION.md"""
+    rows = conn.execute(
+        "SELECT r.* FROM note_revisions r WHERE r.note_id IN (SELECT value FROM json_each(?)) "
+        "AND r.revision >= (SELECT max(s.revision) FROM note_revisions s "
+        "WHERE s.note_id = r.note_id AND s.kind = 'snapshot') "
+        "ORDER BY r.note_id, r.revision DESC", (json.dumps(params.get('p_note_ids') or []),))
+    return [dict(row) for row in rows]
+
+
+def _note_sync_horizon_rpc(conn, params):
+    """Emulate the note_sync_horizon() SQL function from SUPABASE_MIGRATION.md"""
+    return [{'horizon': conn.execute('SELECT last_value + 1 FROM note_sync_seq').fetchone()[0]}]
+
+
+def _encode(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request to stderr"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(app, host='127.0.0.1', port=0):
+    """Start ``app`` on a background thread and return the server"""
+    server = make_server(host, port, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local PostgREST stand-in backed by SQLite')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--db', default=':memory:', help='SQLite database path')
+    parser.add_argument('--seed', type=int, default=0, help='number of synthetic notes to create')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds to wait per LLM call')
+    args = parser.parse_args()
+
+    fake = FakePostgrest(args.db, llm_latency=args.llm_latency)
+    if args.seed:
+        fake.seed_notes(args.seed)
+    print(f'Fake PostgREST listening on http://{args.host}:{args.port}')
+    make_server(args.host, args.port, fake, threaded=True).serve_forever()
@@ -0,0 +1,220 @@
+"""HTTP load test for the notes API against a local PostgREST stand-in.
+
+Starts the fake backend from ``bench.fake_postgrest`` and the Flask app on
+local ports, seeds the database with a growing number of notes and drives the
+API with scripted workloads that mirror the frontend in ``src/static``:
+
+    list       load the note list (page load / after every mutation)
+    autosave   PUT the open note as the user types (every 2s of idle)
+    search     one search request per keystroke while typing a word
+    reorder    drag a note to the top and POST the full id order
+    translate  translate the open note (LLM calls served by the fake)
+
+Throughput and latency percentiles are reported per endpoint for every
+dataset size.
+
+Usage:
+    python -m bench.run --sizes 100,1000,10000,100000 --duration 20 --users 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+from bench.fake_postgrest import FakePostgrest, serve
+
+# Dummy JWT-shaped key, supabase-py only validates the format
+BENCH_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.YmVuY2g'
+SEARCH_WORDS = ('badminton', 'meeting', 'project', 'library', 'nothing-matches')
+
+
+class Recorder:
+    """Collects per-endpoint latencies from all virtual users"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        rows = []
+        for endpoint, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'errors': self.errors[endpoint],
+                'rps': len(samples) / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p95_ms': percentile(samples, 0.95) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+            })
+        return rows
+
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class VirtualUser:
+    """One browser tab running a workload in a loop until ``deadline``"""
+
+    def __init__(self, base_url, recorder, think_scale, timeout):
+        self.client = httpx.Client(base_url=base_url, timeout=timeout)
+        self.recorder = recorder
+        self.think_scale = think_scale
+        self.note_ids = []
+
+    def call(self, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        response = None
+        try:
+            response = self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            pass
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    def think(self, seconds):
+        if self.think_scale:
+            time.sleep(seconds * self.think_scale)
+
+    def pick_note(self):
+        if not self.note_ids:
+            self.list()
+        return random.choice(self.note_ids) if self.note_ids else None
+
+    # -- workloads ---------------------------------------------------------
+
+    def list(self):
+        response = self.call('GET /api/notes', 'GET', '/api/notes')
+        if response is not None and response.status_code == 200:
+            self.note_ids = [note['id'] for note in response.json()]
+
+    def autosave(self):
+        note_id = self.pick_note()
+        if note_id is None:
+            return
+        for edit in range(5):
+            self.call('PUT /api/notes/<id>', 'PUT', f'/api/notes/{note_id}', json={
+                'title': f'Edited note {note_id}',
+                'content': f'Autosaved content revision {edit} at {time.time()}',
+            })
+            self.think(2.0)
+
+    def search(self):
+        word = random.choice(SEARCH_WORDS)
+        for end in range(1, len(word) + 1):
+            self.call('GET /api/notes/search', 'GET', '/api/notes/search', params={'q': word[:end]})
+            self.think(0.15)
+
+    def reorder(self):
+        if not self.note_ids:
+            self.list()
+        if len(self.note_ids) < 2:
+            return
+        ids = list(self.note_ids)
+        ids.insert(0, ids.pop(random.randrange(len(ids))))
+        self.call('POST /api/notes/reorder', 'POST', '/api/notes/reorder', json={'order': ids})
+        self.note_ids = ids
+
+    def translate(self):
+        note_id = self.pick_note()
+        if note_id is not None:
+            self.call('POST /api/notes/<id>/translate', 'POST', f'/api/notes/{note_id}/translate',
+                      json={'target_language': 'French'})
+
+    def run(self, workloads, deadline):
+        self.list()
+        while time.time() < deadline:
+            getattr(self, random.choice(workloads))()
+            self.think(1.0)
+        self.client.close()
+
+
+def run_size(fake, base_url, size, args):
+    fake.reset()
+    fake.seed_notes(size)
+    recorder = Recorder()
+    deadline = time.time() + args.duration
+    users = [VirtualUser(base_url, recorder, args.think_scale, args.timeout) for _ in range(args.users)]
+    threads = [threading.Thread(target=user.run, args=(args.workloads, deadline)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - start)
+
+
+def print_table(size, rows):
+    print(f'\n== {size} notes ==')
+    print(f'{"endpoint":<32}{"reqs":>8}{"errs":>6}{"req/s":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for row in rows:
+        print(f'{row["endpoint"]:<32}{row["requests"]:>8}{row["errors"]:>6}{row["rps"]:>9.1f}'
+              f'{row["p50_ms"]:>10.1f}{row["p95_ms"]:>10.1f}{row["p99_ms"]:>10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the notes API against a local PostgREST stand-in')
+    parser.add_argument('--sizes', default='100,1000,10000,100000', help='comma-separated dataset sizes')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per dataset size')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--workloads', default='list,autosave,search,reorder,translate',
+                        help='comma-separated subset of workloads')
+    parser.add_argument('--think-scale', type=float, default=0.0,
+                        help='multiplier for frontend pauses (1 = real typing/autosave pace, 0 = none)')
+    parser.add_argument('--llm-latency', type=float, default=0.3, help='simulated seconds per LLM call')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout in seconds')
+    parser.add_argument('--json', help='also write results to this JSON file')
+    args = parser.parse_args()
+    args.workloads = [w.strip() for w in args.workloads.split(',') if w.strip()]
+
+    fake = FakePostgrest(llm_latency=args.llm_latency)
+    backend = serve(fake)
+    backend_url = f'http://127.0.0.1:{backend.server_port}'
+
+    # The app reads its configuration at import time
+    os.environ['SUPABASE_URL'] = backend_url
+    os.environ['SUPABASE_ANON_KEY'] = BENCH_KEY
+    os.environ['GITHUB_TOKEN'] = 'bench'
+    os.environ['LLM_ENDPOINT'] = f'{backend_url}/llm'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.main import app
+
+    server = serve(app)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        rows = run_size(fake, base_url, size, args)
+        results[size] = rows
+        print_table(size, rows)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    server.shutdown()
+    backend.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,154 +6,249 @@ Run this after setting up your Supabase project and tables.
 
 Prerequisites:
 1. Create Supabase project
-2. Run the table creation SQL in Supabase
+2. Run the table creation SQL in Supabase (including the checksum functions
+   from SUPABASE_MIGRATION.md, used for verification)
 3. Set SUPABASE_URL and SUPABASE_ANON_KEY (or SERVICE_ROLE_KEY) in .env
 4. Ensure the app is using the new Supabase models
+
+Rows are streamed from SQLite in batches and upserted concurrently, so memory
+use does not depend on the table size. Users are upserted on `username` and
+notes on their original `id`, which makes reruns idempotent. Progress is
+checkpointed after every batch so an interrupted run resumes where it stopped.
+
+Usage:
+    python scripts/migrate_sqlite_to_supabase.py [--batch-size 500] [--workers 4]
+        [--checkpoint .migration_checkpoint.json] [--restart] [--verify-only]
 """
 
+import argparse
+import hashlib
+import json
 import os
+import random
 import sqlite3
-import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from src.config import supabase
+from src.agenda import event_at
 
 # Path to the existing SQLite database
 SQLITE_DB_PATH = os.path.join("database", "app.db")
+CHECKPOINT_PATH = ".migration_checkpoint.json"
 
-def migrate_users():
-    """Migrate users from SQLite to Supabase"""
-    print("Migrating users...")
-    
-    # Check if SQLite DB exists
-    if not os.path.exists(SQLITE_DB_PATH):
-        print(f"SQLite database not found at {SQLITE_DB_PATH}")
-        return
-    
-    # Connect to SQLite
-    conn = sqlite3.connect(SQLITE_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    try:
-        # Get all users from SQLite
-        cursor.execute("SELECT * FROM user")
-        users = cursor.fetchall()
-        
-        if not users:
-            print("No users found to migrate")
+BATCH_ATTEMPTS = 4
+
+
+def convert_user(user):
+    now = datetime.utcnow().isoformat()
+    return {
+        'username': user['username'],
+        'email': user['email'],
+        'created_at': user.get('created_at') or now,
+        'updated_at': user.get('updated_at') or now
+    }
+
+
+def convert_note(note):
+    # Handle tags - convert from JSON string to proper format
+    tags = None
+    if note.get('tags'):
+        try:
+            tags = json.loads(note['tags'])
+        except (TypeError, ValueError):
+            # If not valid JSON, treat as comma-separated string
+            tags = [tag.strip() for tag in note['tags'].split(',') if tag.strip()]
+
+    now = datetime.utcnow().isoformat()
+    return {
+        'id': note['id'],
+        'title': note['title'],
+        'content': note['content'],
+        'order': note.get('order') or 0,
+        'tags': json.dumps(tags) if tags else None,
+        'event_date': note.get('event_date'),
+        'event_time': note.get('event_time'),
+        'event_at': event_at(note.get('event_date'), note.get('event_time')),
+        'created_at': note.get('created_at') or now,
+        'updated_at': note.get('updated_at') or now
+    }
+
+
+# source table, target table, natural key used for upserts, row converter
+TABLES = {
+    'users': ('user', 'users', 'username', convert_user),
+    'notes': ('note', 'notes', 'id', convert_note),
+}
+
+
+class Checkpoint:
+    """Last fully migrated SQLite rowid per table, persisted as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.positions = json.load(f)
+
+    def get(self, table):
+        return self.positions.get(table, 0)
+
+    def set(self, table, rowid):
+        with self._lock:
+            self.positions[table] = rowid
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.positions, f)
+            os.replace(tmp_path, self.path)
+
+
+def upsert_batch(target, natural_key, rows):
+    """Upsert one batch, retrying transient failures with jittered backoff"""
+    for attempt in range(BATCH_ATTEMPTS):
+        try:
+            supabase.table(target).upsert(rows, on_conflict=natural_key, returning='minimal').execute()
             return
-        
-        # Convert to list of dicts
-        user_data = []
-        for user in users:
-            user_dict = {
-                'username': user['username'],
-                'email': user['email'],
-                'created_at': datetime.utcnow().isoformat(),
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            user_data.append(user_dict)
-        
-        # Insert into Supabase
-        result = supabase.table('users').insert(user_data).execute()
-        print(f"Successfully migrated {len(user_data)} users")
-        
-    except sqlite3.Error as e:
-        print(f"SQLite error: {e}")
-    except Exception as e:
-        print(f"Error migrating users: {e}")
-    finally:
-        conn.close()
+        except Exception:
+            if attempt == BATCH_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+
+def migrate_table(conn, name, checkpoint, batch_size, workers):
+    """Stream one table from SQLite and upsert it into Supabase"""
+    source, target, natural_key, convert = TABLES[name]
+    print(f"Migrating {name}...")
+
+    start_rowid = checkpoint.get(name)
+    if start_rowid:
+        print(f"  resuming after rowid {start_rowid}")
 
-def migrate_notes():
-    """Migrate notes from SQLite to Supabase"""
-    print("Migrating notes...")
-    
-    # Check if SQLite DB exists
-    if not os.path.exists(SQLITE_DB_PATH):
-        print(f"SQLite database not found at {SQLITE_DB_PATH}")
-        return
-    
-    # Connect to SQLite
-    conn = sqlite3.connect(SQLITE_DB_PATH)
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    
-    try:
-        # Get all notes from SQLite
-        cursor.execute("SELECT * FROM note")
-        notes = cursor.fetchall()
-        
-        if not notes:
-            print("No notes found to migrate")
-            return
-        
-        # Convert to list of dicts
-        note_data = []
-        for note in notes:
-            # Handle tags - convert from JSON string to proper format
-            tags = None
-            if note['tags']:
-                try:
-                    tags = json.loads(note['tags'])
-                except:
-                    # If not valid JSON, treat as comma-separated string
-                    tags = [tag.strip() for tag in note['tags'].split(',') if tag.strip()]
-            
-            note_dict = {
-                'title': note['title'],
-                'content': note['content'],
-                'order': note.get('order', 0),
-                'tags': json.dumps(tags) if tags else None,
-                'event_date': note.get('event_date'),
-                'event_time': note.get('event_time'),
-                'created_at': note['created_at'] if note.get('created_at') else datetime.utcnow().isoformat(),
-                'updated_at': note['updated_at'] if note.get('updated_at') else datetime.utcnow().isoformat()
-            }
-            note_data.append(note_dict)
-        
-        # Insert into Supabase in batches
-        batch_size = 100
-        for i in range(0, len(note_data), batch_size):
-            batch = note_data[i:i + batch_size]
-            result = supabase.table('notes').insert(batch).execute()
-            print(f"Migrated batch {i//batch_size + 1}: {len(batch)} notes")
-        
-        print(f"Successfully migrated {len(note_data)} notes")
-        
-    except sqlite3.Error as e:
-        print(f"SQLite error: {e}")
-    except Exception as e:
-        print(f"Error migrating notes: {e}")
-    finally:
-        conn.close()
+    cursor.execute(f"SELECT rowid AS _rowid, * FROM {source} WHERE rowid > ? ORDER BY rowid", (start_rowid,))
+
+    # Batches finish out of order; the checkpoint only advances over a
+    # contiguous prefix of completed batches so a resume never skips rows
+    pending = {}      # future -> (batch_number, last_rowid, size)
+    completed = {}    # batch_number -> last_rowid
+    next_to_commit = 0
+    batch_number = 0
+    migrated = 0
+    started = time.perf_counter()
+
+    def drain(return_when):
+        nonlocal next_to_commit, migrated
+        done, _ = wait(list(pending), return_when=return_when)
+        for future in done:
+            number, last_rowid, size = pending.pop(future)
+            future.result()  # re-raise batch failures
+            completed[number] = last_rowid
+            migrated += size
+        advanced = None
+        while next_to_commit in completed:
+            advanced = completed.pop(next_to_commit)
+            next_to_commit += 1
+        if advanced is not None:
+            checkpoint.set(name, advanced)
+            elapsed = time.perf_counter() - started
+            print(f"  {migrated} rows ({migrated / elapsed:.0f} rows/s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            rows = [dict(row) for row in rows]
+            batch = [convert(row) for row in rows]
+            future = executor.submit(upsert_batch, target, natural_key, batch)
+            pending[future] = (batch_number, rows[-1]['_rowid'], len(batch))
+            batch_number += 1
+            # Bound the number of batches held in memory
+            if len(pending) >= workers * 2:
+                drain(FIRST_COMPLETED)
+        while pending:
+            drain(FIRST_COMPLETED)
+
+    elapsed = time.perf_counter() - started
+    rate = migrated / elapsed if elapsed else 0
+    print(f"Successfully migrated {migrated} {name} in {elapsed:.1f}s ({rate:.0f} rows/s)")
+    return migrated
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def local_checksum(conn, name):
+    """Same digest as the <table>_checksum() SQL functions in SUPABASE_MIGRATION.md"""
+    if name == 'users':
+        rows = conn.execute("SELECT username, email FROM user ORDER BY username")
+        parts = (f"{username}:{_md5(email)}" for username, email in rows)
+    else:
+        rows = conn.execute("SELECT id, title, content FROM note ORDER BY id")
+        parts = (f"{note_id}:{_md5(title + chr(31) + content)}" for note_id, title, content in rows)
+    return _md5(','.join(parts))
+
 
-def verify_migration():
-    """Verify the migration by counting records in Supabase"""
+def verify_migration(conn):
+    """Verify the migration with server-side counts and checksums"""
     print("\nVerifying migration...")
-    
-    try:
-        # Count users
-        user_result = supabase.table('users').select('id').execute()
-        user_count = len(user_result.data)
-        print(f"Users in Supabase: {user_count}")
-        
-        # Count notes
-        note_result = supabase.table('notes').select('id').execute()
-        note_count = len(note_result.data)
-        print(f"Notes in Supabase: {note_count}")
-        
-    except Exception as e:
-        print(f"Error verifying migration: {e}")
+    ok = True
+    for name, (source, target, _, _) in TABLES.items():
+        local_count = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+        try:
+            result = supabase.table(target).select('id', count='exact').limit(1).execute()
+            remote_count = result.count
+        except Exception as e:
+            print(f"Error counting {name}: {e}")
+            ok = False
+            continue
+        status = '✓' if remote_count == local_count else '✗'
+        print(f"{status} {name}: {local_count} in SQLite, {remote_count} in Supabase")
+        ok = ok and remote_count == local_count
+
+        try:
+            rows = supabase.rpc(f'{target}_checksum', {}).execute().data
+            remote_checksum = rows[0]['checksum'] if rows else None
+        except Exception as e:
+            print(f"  checksum unavailable ({e}); create {target}_checksum() from SUPABASE_MIGRATION.md")
+            continue
+        local = local_checksum(conn, name)
+        status = '✓' if remote_checksum == local else '✗'
+        print(f"{status} {name} checksum: {local} local, {remote_checksum} remote")
+        ok = ok and remote_checksum == local
+    return ok
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the SQLite database to Supabase")
+    parser.add_argument('--sqlite', default=SQLITE_DB_PATH, help='path to the SQLite database')
+    parser.add_argument('--batch-size', type=int, default=500, help='rows per upsert request')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent upsert requests')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help='progress file used to resume')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start over')
+    parser.add_argument('--verify-only', action='store_true', help='only compare counts and checksums')
+    args = parser.parse_args()
+
     print("Starting SQLite to Supabase migration...")
     print("Make sure you have:")
     print("1. Created your Supabase project")
     print("2. Created the tables (users, notes) in Supabase")
     print("3. Set SUPABASE_URL and SUPABASE_ANON_KEY in .env")
     print()
-    
+
+    # Check if SQLite DB exists
+    if not os.path.exists(args.sqlite):
+        print(f"SQLite database not found at {args.sqlite}")
+        exit(1)
+
     # Test Supabase connection
     try:
         test_result = supabase.table('users').select('id').limit(1).execute()
@@ -162,11 +257,22 @@ if __name__ == "__main__":
         print(f"✗ Supabase connection failed: {e}")
         print("Please check your configuration and try again.")
         exit(1)
-    
-    # Run migration
-    migrate_users()
-    migrate_notes()
-    verify_migration()
-    
-    print("\nMigration completed!")
-    print("You can now test your app with the new Supabase backend.")
\ No newline at end of file
+
+    conn = sqlite3.connect(args.sqlite)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not args.verify_only:
+            if args.restart and os.path.exists(args.checkpoint):
+                os.remove(args.checkpoint)
+            checkpoint = Checkpoint(args.checkpoint)
+            for name in TABLES:
+                migrate_table(conn, name, checkpoint, args.batch_size, args.workers)
+            print("\nNotes keep their SQLite ids. Move the id sequence past them with:")
+            print("  SELECT setval(pg_get_serial_sequence('notes', 'id'), (SELECT MAX(id) FROM notes));")
+        ok = verify_migration(conn)
+    finally:
+        conn.close()
+
+    print("\nMigration completed!" if ok else "\nMigration finished with verification errors.")
+    print("You can now test your app with the new Supabase backend.")
+    exit(0 if ok else 1)
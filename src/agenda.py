@@ -0,0 +1,143 @@
+"""Event dates of notes: normalization and an optional in-memory index.
+
+Notes keep ``event_date``/``event_time`` as the free text typed by the user
+or extracted by the LLM. ``event_at`` turns them into a sortable
+``YYYY-MM-DDTHH:MM:SS`` timestamp that is stored with the note and indexed,
+so agenda queries are range scans instead of full reads.
+
+Event times are wall-clock times without a zone, as typed ("3pm" means 3pm
+wherever the user is). Query bounds are compared the same way: offsets are
+dropped, and "now" is the wall-clock time of the requested zone.
+
+With ``NOTES_EVENT_INDEX=memory`` the module-level ``index`` additionally
+keeps every user's ``(event_at, note_id)`` pairs in a sorted list: range and
+upcoming queries are two bisections, and saves and deletes update it in
+place. It reflects the writes of this process only, so use it for single
+process deployments.
+"""
+import bisect
+import os
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d.%m.%Y', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%I %p', '%I%p')
+
+
+def _parse(value, formats):
+    value = ' '.join(value.split())
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def event_at(event_date, event_time=None):
+    """Normalize free-text event fields into a timestamp string, or None.
+
+    A missing or unreadable time puts the event at the start of its day.
+    """
+    if not event_date:
+        return None
+    day = _parse(str(event_date), DATE_FORMATS)
+    if day is None:
+        return None
+    time = _parse(str(event_time).upper(), TIME_FORMATS) if event_time else None
+    if time is not None:
+        day = day.replace(hour=time.hour, minute=time.minute, second=time.second)
+    return day.isoformat(timespec='seconds')
+
+
+def normalize(value):
+    """Normalize an ISO date or timestamp (query parameter, database value) to wall-clock time"""
+    return datetime.fromisoformat(value).replace(tzinfo=None).isoformat(timespec='seconds')
+
+
+def now(tz=None):
+    """The current wall-clock time in ``tz`` (an IANA zone name, default: the server's), normalized"""
+    if not tz:
+        return datetime.now().isoformat(timespec='seconds')
+    try:
+        zone = ZoneInfo(tz)
+    except (KeyError, ValueError):
+        raise ValueError(f'Unknown time zone {tz!r}')
+    return datetime.now(zone).replace(tzinfo=None).isoformat(timespec='seconds')
+
+
+class EventIndex:
+    """Per-user sorted (event_at, note_id) lists with incremental updates"""
+
+    def __init__(self):
+        self.entries = {}   # user id -> sorted [(event_at, note_id)]
+        self.notes = {}     # note id -> (user id, event_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.notes)
+
+    def load(self, rows):
+        """Build the index from ``{'id', 'user_id', 'event_at'}`` rows"""
+        with self._lock:
+            self.entries, self.notes = {}, {}
+            for row in rows:
+                if row.get('event_at'):
+                    key = normalize(row['event_at'])
+                    self.notes[row['id']] = (row.get('user_id'), key)
+                    self.entries.setdefault(row.get('user_id'), []).append((key, row['id']))
+            for entries in self.entries.values():
+                entries.sort()
+
+    def update(self, note_id, user_id, event_at):
+        with self._lock:
+            self._remove(note_id)
+            if event_at:
+                key = normalize(event_at)
+                self.notes[note_id] = (user_id, key)
+                bisect.insort(self.entries.setdefault(user_id, []), (key, note_id))
+
+    def remove(self, note_id):
+        with self._lock:
+            self._remove(note_id)
+
+    def _remove(self, note_id):
+        previous = self.notes.pop(note_id, None)
+        if previous is None:
+            return
+        user_id, key = previous
+        entries = self.entries.get(user_id, [])
+        position = bisect.bisect_left(entries, (key, note_id))
+        if position < len(entries) and entries[position] == (key, note_id):
+            del entries[position]
+
+    def range(self, user_id=None, start=None, end=None, limit=None):
+        """Ids of a user's notes with start <= event_at < end, soonest first"""
+        with self._lock:
+            entries = self.entries.get(user_id, [])
+            low = bisect.bisect_left(entries, (normalize(start),)) if start else 0
+            high = bisect.bisect_left(entries, (normalize(end),)) if end else len(entries)
+            if limit is not None:
+                high = min(high, low + limit)
+            return [note_id for _, note_id in entries[low:high]]
+
+
+# Set by configure_from_env() when NOTES_EVENT_INDEX=memory
+index = None
+
+
+def configure_from_env():
+    """Load the in-memory event index when NOTES_EVENT_INDEX=memory"""
+    global index
+    if os.environ.get('NOTES_EVENT_INDEX', '').lower() != 'memory':
+        return None
+    from src.models.note import Note
+    try:
+        event_index = EventIndex()
+        event_index.load(Note.get_event_rows())
+        index = event_index
+        print(f"✓ Event index loaded ({len(index)} events)")
+    except Exception as e:
+        print(f"✗ Failed to load event index, falling back to database queries: {e}")
+    return index
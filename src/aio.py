@@ -0,0 +1,65 @@
+"""Process-wide event loop for async views.
+
+Flask runs ``async def`` views by creating a fresh event loop per request,
+which means async HTTP clients cannot keep connections alive between
+requests. Instead, every coroutine is submitted to one long-lived loop
+running on a daemon thread: the WSGI worker thread only waits on a future,
+while the loop multiplexes all in-flight Supabase and LLM calls over shared
+connection pools.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the shared event loop, starting its thread on first use"""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='aio-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run(coro):
+    """Run ``coro`` on the shared loop and block until it finishes.
+
+    The caller's context variables (Flask request context, metrics collector)
+    are copied into the task so ``request`` and friends keep working.
+    """
+    loop = get_loop()
+    context = contextvars.copy_context()
+    result = concurrent.futures.Future()
+
+    def start():
+        # Tasks copy the current context, which is ``context`` inside this callback
+        task = loop.create_task(coro)
+
+        def finished(t):
+            if t.cancelled():
+                result.cancel()
+            elif t.exception() is not None:
+                result.set_exception(t.exception())
+            else:
+                result.set_result(t.result())
+
+        task.add_done_callback(finished)
+
+    loop.call_soon_threadsafe(start, context=context)
+    return result.result()
+
+
+def async_to_sync(func):
+    """Wrap a coroutine function so it runs on the shared loop"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run(func(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always built
+    brotli = None
+
+# Assets smaller than this are served as-is, compression would not pay off
+MIN_COMPRESS_SIZE = 512
+
+# Cache policy: fingerprinted URLs never change content, everything else
+# (index.html, /favicon.ico) must be revalidated with the ETag on each use
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'image/x-icon',
+                      'image/vnd.microsoft.icon')
+
+
+class Asset:
+    """A static file held in memory together with its compressed variants"""
+
+    def __init__(self, path, body, mimetype, immutable=False):
+        self.path = path
+        self.mimetype = mimetype
+        self.immutable = immutable
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = self.digest[:32]
+        # encoding -> bytes, 'identity' is always present
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.variants['gzip'] = gz
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    self.variants['br'] = br
+
+    @property
+    def fingerprinted_path(self):
+        """Path with the content hash embedded, e.g. favicon.1a2b3c4d5e.ico"""
+        root, ext = os.path.splitext(self.path)
+        return f'{root}.{self.digest[:10]}{ext}'
+
+
+class StaticAssets:
+    """In-memory static file store.
+
+    Every file under ``folder`` is read once at startup, hashed and
+    precompressed. Requests are answered from memory: the best encoding is
+    picked from ``Accept-Encoding`` and ``If-None-Match`` is honoured with 304.
+    Each asset is reachable both under its plain path and under a
+    fingerprinted alias that is served with immutable cache headers.
+    """
+
+    def __init__(self, folder, index='index.html'):
+        self.folder = folder
+        self.index = index
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        """(Re)load all files from disk"""
+        self.assets = {}
+        if not self.folder or not os.path.isdir(self.folder):
+            return
+        raw = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, self.folder).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    raw[rel_path] = f.read()
+
+        # Non-HTML assets first so pages can reference their fingerprinted URLs
+        for rel_path, body in raw.items():
+            if not rel_path.endswith('.html'):
+                self._add(rel_path, body)
+        for rel_path, body in raw.items():
+            if rel_path.endswith('.html'):
+                self._add(rel_path, self._rewrite_references(body))
+
+    def _add(self, rel_path, body):
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        asset = Asset(rel_path, body, mimetype)
+        self.assets[rel_path] = asset
+        fingerprinted = Asset(rel_path, body, mimetype, immutable=True)
+        self.assets[asset.fingerprinted_path] = fingerprinted
+
+    def _rewrite_references(self, body):
+        """Point absolute references like href="/favicon.ico" at fingerprinted URLs"""
+        for rel_path, asset in list(self.assets.items()):
+            if asset.immutable:
+                continue
+            for quote in (b'"', b"'"):
+                plain = quote + b'/' + rel_path.encode() + quote
+                hashed = quote + b'/' + asset.fingerprinted_path.encode() + quote
+                body = body.replace(plain, hashed)
+        return body
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def url_for(self, path):
+        """Return the fingerprinted URL for ``path`` (or the plain one if unknown)"""
+        asset = self.assets.get(path)
+        if asset is None:
+            return '/' + path
+        return '/' + asset.fingerprinted_path
+
+    def serve(self, path):
+        """Serve ``path``, falling back to the SPA index for unknown paths"""
+        asset = self.assets.get(path) if path else None
+        if asset is None:
+            asset = self.assets.get(self.index)
+        if asset is None:
+            return None
+        return self.respond(asset)
+
+    def respond(self, asset):
+        encoding = choose_encoding(asset.variants)
+        etag = asset.etag if encoding == 'identity' else f'{asset.etag}-{encoding}'
+
+        headers = {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL,
+            'Vary': 'Accept-Encoding',
+        }
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        body = asset.variants[encoding]
+        response = Response(b'' if request.method == 'HEAD' else body, mimetype=asset.mimetype, headers=headers)
+        response.set_etag(etag)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.content_length = len(body)
+        return response
+
+
+def choose_encoding(available):
+    """Pick the best encoding in ``available`` acceptable to the client.
+
+    ``available`` is any container of encoding names that includes 'identity'.
+    When the client rates them equally zstd is preferred over brotli, and
+    brotli over gzip.
+    """
+    accept = request.accept_encodings
+    best, best_quality = 'identity', 0
+    for encoding in ('zstd', 'br', 'gzip'):
+        if encoding not in available:
+            continue
+        quality = accept[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
@@ -0,0 +1,84 @@
+"""Response compression for API blueprints.
+
+``compress_blueprint(bp)`` compresses every response of ``bp`` larger than
+``MIN_SIZE`` bytes with the best encoding the client accepts: zstd or brotli
+when those optional packages are installed, gzip otherwise. Streaming
+responses (Server-Sent Events) are left alone so events are not buffered.
+"""
+import gzip
+import threading
+
+from flask import request
+
+from src.assets import choose_encoding
+
+try:
+    import brotli
+except ImportError:  # optional, see requirements.txt
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, see requirements.txt
+    zstandard = None
+
+# Smaller bodies fit in a single packet, compressing them only costs CPU
+MIN_SIZE = 1024
+
+# Fast settings: these bodies are compressed on every request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+# ZstdCompressor objects must not be shared between threads, so each
+# request thread reuses its own
+_local = threading.local()
+
+
+def _zstd_compress(body):
+    compressor = getattr(_local, 'zstd', None)
+    if compressor is None:
+        compressor = _local.zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor.compress(body)
+
+
+def _compressors():
+    compressors = {'gzip': lambda body: gzip.compress(body, GZIP_LEVEL)}
+    if brotli is not None:
+        compressors['br'] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    if zstandard is not None:
+        compressors['zstd'] = _zstd_compress
+    return compressors
+
+
+COMPRESSORS = _compressors()
+AVAILABLE = {'identity', *COMPRESSORS}
+
+
+def compress_response(response, min_size=MIN_SIZE):
+    """Compress ``response`` in place when it is worth it and the client agrees"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype == 'text/event-stream'):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    encoding = choose_encoding(AVAILABLE)
+    if encoding == 'identity':
+        return response
+    response.set_data(COMPRESSORS[encoding](body))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def compress_blueprint(bp, min_size=MIN_SIZE):
+    """Compress every response of ``bp`` above ``min_size`` bytes"""
+
+    @bp.after_request
+    def _compress(response):
+        return compress_response(response, min_size)
+
+    return bp
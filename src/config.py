@@ -2,6 +2,8 @@ import os
 from supabase import create_client
 from dotenv import load_dotenv
 
+from src import transport
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -43,4 +45,25 @@ except Exception as e:
             raise Exception(f"All Supabase client initialization strategies failed. Original error: {e}")
 
 if supabase is None:
-    raise Exception("Failed to initialize Supabase client")
\ No newline at end of file
+    raise Exception("Failed to initialize Supabase client")
+
+# Pooled connections, timeouts, retries and a circuit breaker for every
+# PostgREST call the models make (see src/transport.py)
+transport.install(supabase.postgrest)
+
+
+# Async PostgREST client for async views. It is only ever used from the shared
+# event loop in `src.aio`, so a single instance keeps one connection pool.
+_async_postgrest = None
+
+
+def get_async_postgrest():
+    """Return the async PostgREST client, creating it on first use"""
+    global _async_postgrest
+    if _async_postgrest is None:
+        from postgrest import AsyncPostgrestClient
+        _async_postgrest = transport.install(AsyncPostgrestClient(
+            f"{SUPABASE_URL}/rest/v1",
+            headers={"apiKey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"},
+        ), kind='async')
+    return _async_postgrest
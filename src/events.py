@@ -0,0 +1,202 @@
+"""In-process pub/sub for note change events.
+
+``Note.save``, ``Note.delete`` and ``Note.update_orders`` publish compact
+events to the module-level ``broker``; ``/api/notes/stream`` subscribes and
+forwards them to browsers over Server-Sent Events.
+
+Publishing never blocks: every subscriber has a bounded buffer and a client
+that falls behind has its buffer dropped and receives a single ``resync``
+event instead, telling it to catch up through ``/api/notes/changes``.
+
+Events carry the owning ``user_id`` and subscribers only receive events from
+their own partition (``None`` being the shared, anonymous one).
+
+When ``NOTES_REALTIME=supabase`` is set, events are taken from Supabase
+Realtime instead of the local models, so every process sees changes made by
+any other process.
+"""
+import itertools
+import os
+import threading
+from collections import deque
+
+# Events kept for clients reconnecting with Last-Event-ID
+HISTORY_SIZE = 1000
+# Events buffered per subscriber before it is asked to resync
+SUBSCRIBER_BUFFER_SIZE = 256
+
+
+class Event:
+    __slots__ = ('id', 'type', 'data', 'user_id')
+
+    def __init__(self, event_id, event_type, data, user_id=None):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.user_id = user_id
+
+
+class Subscription:
+    """A subscriber's bounded event buffer"""
+
+    def __init__(self, broker, maxsize=SUBSCRIBER_BUFFER_SIZE, user_id=None):
+        self.broker = broker
+        self.user_id = user_id
+        self.maxsize = maxsize
+        self.events = deque()
+        self.overflowed = False
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            if self.overflowed:
+                return
+            if len(self.events) >= self.maxsize:
+                # Slow consumer: drop what is buffered, the client resyncs instead
+                self.events.clear()
+                self.overflowed = True
+            else:
+                self.events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Wait for the next event.
+
+        Returns an Event, the string 'resync' after an overflow, or None on
+        timeout or when the subscription is closed.
+        """
+        with self._cond:
+            if not self.events and not self.overflowed and not self.closed:
+                self._cond.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return 'resync'
+            if self.events:
+                return self.events.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.subscribers = set()
+        self.history = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Disabled while the Supabase Realtime bridge is the source of events
+        self.local_publish = True
+
+    def subscribe(self, last_event_id=None, maxsize=SUBSCRIBER_BUFFER_SIZE, user_id=None):
+        """Register a subscriber for ``user_id``'s events, replaying history after ``last_event_id``"""
+        subscription = Subscription(self, maxsize, user_id)
+        with self._lock:
+            self.subscribers.add(subscription)
+            if last_event_id is not None:
+                missed = [event for event in self.history
+                          if event.id > last_event_id and event.user_id == user_id]
+                oldest = self.history[0].id if self.history else 1
+                latest = self.history[-1].id if self.history else 0
+                if last_event_id < oldest - 1 or last_event_id > latest:
+                    # History no longer covers the gap, or ids restarted with the process
+                    subscription.overflowed = True
+                else:
+                    for event in missed:
+                        subscription.push(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event_type, data, source='local', user_id=None):
+        if source == 'local' and not self.local_publish:
+            return None
+        with self._lock:
+            event = Event(next(self._ids), event_type, data, user_id)
+            self.history.append(event)
+            subscribers = [s for s in self.subscribers if s.user_id == user_id]
+        for subscription in subscribers:
+            subscription.push(event)
+        return event
+
+
+broker = Broker()
+
+
+def publish(event_type, data, user_id=None):
+    """Publish a note change event from the local models"""
+    return broker.publish(event_type, data, user_id=user_id)
+
+
+def start_supabase_bridge(supabase_url, supabase_key, table='notes'):
+    """Forward Supabase Realtime changes on ``table`` to the local broker.
+
+    Runs the realtime client on a daemon thread with its own event loop.
+    Local publishing is switched off once the channel has joined, so events
+    are not delivered twice, and back on if the connection fails or ends.
+    """
+    from realtime.connection import Socket
+    import asyncio
+
+    ws_url = supabase_url.replace('http', 'ws', 1).rstrip('/')
+    socket_url = f'{ws_url}/realtime/v1/websocket?apikey={supabase_key}&vsn=1.0.0'
+
+    def on_change(payload):
+        # Supabase sends {'type': 'INSERT'|'UPDATE'|'DELETE', 'record', 'old_record'},
+        # newer servers wrap it in {'data': ...}
+        change = payload.get('data', payload) if isinstance(payload, dict) else {}
+        change_type = change.get('type')
+        if change_type in ('INSERT', 'UPDATE'):
+            from src.models.note import Note
+            note = Note(**change.get('record', {}))
+            broker.publish('upsert', note.to_dict(), source='supabase', user_id=note.user_id)
+        elif change_type == 'DELETE':
+            # old_record only carries user_id with REPLICA IDENTITY FULL on notes
+            old = change.get('old_record') or {}
+            broker.publish('delete', {'id': old.get('id')}, source='supabase', user_id=old.get('user_id'))
+
+    def run():
+        try:
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            socket = Socket(socket_url, auto_reconnect=True)
+            socket.connect()
+            socket.set_channel(f'realtime:public:{table}').join().on('*', on_change)
+            broker.local_publish = False
+            socket.listen()
+        except Exception as e:
+            print(f"✗ Supabase realtime bridge stopped, publishing events locally: {e}")
+        finally:
+            broker.local_publish = True
+
+    threading.Thread(target=run, name='supabase-realtime', daemon=True).start()
+
+
+def stream_enabled():
+    """Whether /notes/stream is served (NOTES_STREAM=0/1, off by default on Vercel).
+
+    Each open stream holds a worker thread for as long as the client stays
+    connected, so it needs a threaded or gevent worker; serverless functions
+    would be held until their timeout. Clients poll /notes/changes instead.
+    """
+    setting = os.environ.get('NOTES_STREAM', '').lower()
+    if setting:
+        return setting not in ('0', 'false', 'off')
+    return not os.environ.get('VERCEL')
+
+
+def configure_from_env():
+    """Start the Supabase Realtime bridge when NOTES_REALTIME=supabase"""
+    if os.environ.get('NOTES_REALTIME', '').lower() != 'supabase':
+        return
+    from src.config import SUPABASE_URL, SUPABASE_KEY
+    try:
+        start_supabase_bridge(SUPABASE_URL, SUPABASE_KEY)
+        print("✓ Supabase realtime bridge started")
+    except Exception as e:
+        print(f"✗ Failed to start Supabase realtime bridge: {e}")
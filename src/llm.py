@@ -1,13 +1,15 @@
 # import libraries
+import asyncio
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+from src.metrics import track
 
 
 load_dotenv()  # Loads environment variables from .env
 # Do NOT read sensitive environment variables at import time to avoid crashes
 # when the environment variable is not available (for example, on Vercel during build).
-endpoint = "https://models.github.ai/inference"
+endpoint = os.environ.get("LLM_ENDPOINT", "https://models.github.ai/inference")
 model = "openai/gpt-4.1-mini"
 # A function to call an LLM model and return the response
 def call_llm_model(model, messages, temperature=1.0, top_p=1.0):
@@ -19,10 +21,11 @@ def call_llm_model(model, messages, temperature=1.0, top_p=1.0):
         raise RuntimeError("GITHUB_TOKEN environment variable is not set. LLM calls require this token.")
 
     client = OpenAI(base_url=endpoint, api_key=token)
-    response = client.chat.completions.create(
-        messages=messages,
-        temperature=temperature, top_p=top_p, model=model
-    )
+    with track('llm', model):
+        response = client.chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model
+        )
     return response.choices[0].message.content
 
 # A function to call an LLM model and return the response
@@ -32,15 +35,44 @@ def call_llm_model_raw(model, messages, temperature=1.0, top_p=1.0):
         raise RuntimeError("GITHUB_TOKEN environment variable is not set. LLM calls require this token.")
 
     client = OpenAI(base_url=endpoint, api_key=token)
-    response = client.chat.completions.create(
-        messages=messages,
-        temperature=temperature, top_p=top_p, model=model
-    )
+    with track('llm', model):
+        response = client.chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model
+        )
     return response
 
-# A function to translate text using the LLM model
-def translate_text(text, target_language="French"):
-    messages = [
+
+# Async client shared by all coroutines on the event loop in `src.aio`, so
+# concurrent LLM calls reuse keep-alive connections
+_async_client = None
+_async_client_token = None
+
+
+def _get_async_client():
+    global _async_client, _async_client_token
+    token = os.environ.get("GITHUB_TOKEN")
+    if not token:
+        raise RuntimeError("GITHUB_TOKEN environment variable is not set. LLM calls require this token.")
+    if _async_client is None or _async_client_token != token:
+        _async_client = AsyncOpenAI(base_url=endpoint, api_key=token)
+        _async_client_token = token
+    return _async_client
+
+
+# Async version of call_llm_model for async views
+async def acall_llm_model(model, messages, temperature=1.0, top_p=1.0):
+    client = _get_async_client()
+    with track('llm', model):
+        response = await client.chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model
+        )
+    return response.choices[0].message.content
+
+
+def _translate_messages(text, target_language):
+    return [
         {
             "role": "system",
             "content": "You are a helpful assistant that translates text to other languages.",
@@ -50,90 +82,118 @@ def translate_text(text, target_language="French"):
             "content": f"Translate the following text to {target_language}: {text}",
         }
     ]
-    return call_llm_model(model, messages)
 
 
-def translate_tags(tags, target_language="French"):
-    """Translate a list of tag strings and return a comma-separated string
-    containing only the literal translations (no extra text or punctuation).
+# A function to translate text using the LLM model
+def translate_text(text, target_language="French"):
+    return call_llm_model(model, _translate_messages(text, target_language))
 
-    tags: list[str] or comma-separated string
-    returns: string like "老师, 指导者, 学校"
-    """
-    # Normalize tags to a list of plain words
+
+async def atranslate_text(text, target_language="French"):
+    return await acall_llm_model(model, _translate_messages(text, target_language))
+
+
+def _normalize_tags(tags):
+    """Turn a list, JSON string or comma-separated string into a list of tags"""
     if not tags:
-        return ''
+        return []
     if isinstance(tags, str):
         # If tags is a JSON-like string (e.g., '["A","B"]') or CSV, try to parse
         import json
         try:
             parsed = json.loads(tags)
             if isinstance(parsed, list):
-                tag_list = [t for t in parsed]
-            else:
-                # fallback: split by comma
-                tag_list = [t.strip() for t in tags.split(',') if t.strip()]
+                return [t for t in parsed]
+            # fallback: split by comma
+            return [t.strip() for t in tags.split(',') if t.strip()]
         except Exception:
-            tag_list = [t.strip() for t in tags.split(',') if t.strip()]
-    elif isinstance(tags, list):
-        tag_list = [t for t in tags]
-    else:
-        tag_list = [str(tags)]
+            return [t.strip() for t in tags.split(',') if t.strip()]
+    if isinstance(tags, list):
+        return [t for t in tags]
+    return [str(tags)]
+
+
+def _tag_translation_messages(tag, target_language):
+    # Ask the model to return only the literal translated word
+    return [
+        {
+            "role": "system",
+            "content": "You are a strict translator. When asked to translate a single word or short phrase, respond with ONLY the translated word or phrase in the target language. Do NOT add any extra text, explanation, punctuation, or quotes."
+        },
+        {
+            "role": "user",
+            "content": f"Translate the following word to {target_language}: {tag}"
+        }
+    ]
+
+
+def _clean_tag_translation(res):
+    """Strip backticks, brackets, quotes and extra lines from a model answer"""
+    res = res.replace('`', '').strip()
+    if res.startswith('[') and res.endswith(']'):
+        try:
+            import json
+            parsed = json.loads(res)
+            if isinstance(parsed, list) and parsed:
+                res = str(parsed[0]).strip()
+        except Exception:
+            # fallback to trimming brackets
+            res = res.lstrip('[').rstrip(']')
+
+    # Remove surrounding quotes
+    if (res.startswith('"') and res.endswith('"')) or (res.startswith("'") and res.endswith("'")):
+        res = res[1:-1].strip()
+
+    # If model returns multiple lines, take first non-empty line
+    if '\n' in res:
+        lines = [l.strip() for l in res.splitlines() if l.strip()]
+        res = lines[0] if lines else res
+    return res
+
+
+def translate_tags(tags, target_language="French"):
+    """Translate a list of tag strings and return a comma-separated string
+    containing only the literal translations (no extra text or punctuation).
+
+    tags: list[str] or comma-separated string
+    returns: string like "老师, 指导者, 学校"
+    """
+    tag_list = [str(t).strip() for t in _normalize_tags(tags)]
 
     # Translate tags one-by-one to reduce ambiguity and force a single-word response
     translations = []
-    for tag in tag_list:
-        t = str(tag).strip()
+    for t in tag_list:
         if not t:
             continue
-        # Ask the model to return only the literal translated word
-        messages = [
-            {
-                "role": "system",
-                "content": "You are a strict translator. When asked to translate a single word or short phrase, respond with ONLY the translated word or phrase in the target language. Do NOT add any extra text, explanation, punctuation, or quotes."
-            },
-            {
-                "role": "user",
-                "content": f"Translate the following word to {target_language}: {t}"
-            }
-        ]
         try:
-            res = call_llm_model(model, messages).strip()
+            res = call_llm_model(model, _tag_translation_messages(t, target_language)).strip()
         except Exception:
             res = ''
-
-        # Clean the response: remove backticks, surrounding quotes, brackets
-        res = res.replace('`', '').strip()
-        if res.startswith('[') and res.endswith(']'):
-            try:
-                import json
-                parsed = json.loads(res)
-                if isinstance(parsed, list) and parsed:
-                    res = str(parsed[0]).strip()
-            except Exception:
-                # fallback to trimming brackets
-                res = res.lstrip('[').rstrip(']')
-
-        # Remove surrounding quotes
-        if (res.startswith('"') and res.endswith('"')) or (res.startswith("'") and res.endswith("'")):
-            res = res[1:-1].strip()
-
-        # If model returns multiple lines, take first non-empty line
-        if '\n' in res:
-            lines = [l.strip() for l in res.splitlines() if l.strip()]
-            res = lines[0] if lines else res
-
-        translations.append(res)
+        translations.append(_clean_tag_translation(res))
 
     # Join translations preserving order, skipping empties
     cleaned_translations = [s for s in [t.strip() for t in translations] if s]
     return ', '.join(cleaned_translations)
 
 
-# A function to detect the language of text using the LLM model
-def detect_language(text):
-    """Detect the language of the given text"""
-    messages = [
+async def atranslate_tags(tags, target_language="French"):
+    """Async version of translate_tags, translating all tags concurrently"""
+    tag_list = [t for t in (str(t).strip() for t in _normalize_tags(tags)) if t]
+
+    async def translate_one(t):
+        try:
+            res = (await acall_llm_model(model, _tag_translation_messages(t, target_language))).strip()
+        except Exception:
+            res = ''
+        return _clean_tag_translation(res)
+
+    translations = await asyncio.gather(*(translate_one(t) for t in tag_list))
+    cleaned_translations = [s for s in [t.strip() for t in translations] if s]
+    return ', '.join(cleaned_translations)
+
+
+def _detect_language_messages(text):
+    return [
         {
             "role": "system",
             "content": "You are a helpful assistant that detects the language of text. Respond with only the language name in English (e.g., 'English', 'French', 'Spanish', etc.).",
@@ -143,12 +203,20 @@ def detect_language(text):
             "content": f"What language is this text written in? Text: {text}",
         }
     ]
-    return call_llm_model(model, messages).strip()
 
 
-def generate_notes_from_title(title, lang="English"):
-    """Generate detailed notes/content from a short title using the LLM."""
-    messages = [
+# A function to detect the language of text using the LLM model
+def detect_language(text):
+    """Detect the language of the given text"""
+    return call_llm_model(model, _detect_language_messages(text)).strip()
+
+
+async def adetect_language(text):
+    return (await acall_llm_model(model, _detect_language_messages(text))).strip()
+
+
+def _generate_notes_messages(title, lang):
+    return [
         {
             "role": "system",
             "content": f"You are a helpful assistant that expands short titles into detailed notes in {lang}. Write concise, clear notes in full sentences based on the title."
@@ -158,7 +226,15 @@ def generate_notes_from_title(title, lang="English"):
             "content": f"Write detailed notes for the title: {title}"
         }
     ]
-    return call_llm_model(model, messages)
+
+
+def generate_notes_from_title(title, lang="English"):
+    """Generate detailed notes/content from a short title using the LLM."""
+    return call_llm_model(model, _generate_notes_messages(title, lang))
+
+
+async def agenerate_notes_from_title(title, lang="English"):
+    return await acall_llm_model(model, _generate_notes_messages(title, lang))
 
 
 system_prompt = '''
@@ -183,12 +259,11 @@ Output:
 }}
 '''
 
-# A function to extract structured notes using the LLM model
-def extract_structured_notes(text, lang="English"):
+def _structured_notes_messages(text, lang):
     from datetime import datetime
     current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M")
     prompt = system_prompt.format(current_datetime=current_datetime, lang=lang)
-    messages = [
+    return [
         {
             "role": "system",
             "content": prompt
@@ -198,7 +273,9 @@ def extract_structured_notes(text, lang="English"):
             "content": f"Extract structured notes from the following text: {text}"
         }
     ]
-    response = call_llm_model(model, messages)
+
+
+def _parse_structured_notes(response):
     # Attempt to parse the response as JSON
     import json
     try:
@@ -209,6 +286,17 @@ def extract_structured_notes(text, lang="English"):
         return {"error": "Failed to parse JSON", "response": response}
 
 
+# A function to extract structured notes using the LLM model
+def extract_structured_notes(text, lang="English"):
+    response = call_llm_model(model, _structured_notes_messages(text, lang))
+    return _parse_structured_notes(response)
+
+
+async def aextract_structured_notes(text, lang="English"):
+    response = await acall_llm_model(model, _structured_notes_messages(text, lang))
+    return _parse_structured_notes(response)
+
+
 # main function for testing
 if __name__ == "__main__":
     # test the extract notes feature
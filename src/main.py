@@ -3,7 +3,7 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -13,12 +13,20 @@ load_dotenv()
 # Import blueprints after environment variables are loaded so modules that
 # read environment variables at import time (for example `src.config`) work
 # correctly during server startup on platforms like Vercel.
-from src.routes.user import user_bp
+from src.routes.user import error_response, user_bp
 from src.routes.note import note_bp
+from src.transport import BackendUnavailable
+from src.assets import StaticAssets
+from src.metrics import metrics_view
+from src import agenda, aio, events, profiling, semantic, write_behind
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
+# Run async views (LLM-bound note routes) on one shared event loop so their
+# Supabase/OpenAI clients keep pooled connections across requests
+app.async_to_sync = aio.async_to_sync
+
 # Enable CORS for all routes
 CORS(app)
 
@@ -26,6 +34,12 @@ CORS(app)
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(note_bp, url_prefix='/api')
 
+# Supabase outages raised outside a route's own error handling are 503s too
+app.register_error_handler(BackendUnavailable, error_response)
+
+# Prometheus scrape endpoint for request and dependency latency histograms
+app.add_url_rule('/metrics', 'metrics', metrics_view)
+
 # Test Supabase connection on startup
 try:
     from src.config import supabase
@@ -34,22 +48,29 @@ except Exception as e:
     print(f"✗ Failed to initialize Supabase client: {e}")
     print("Make sure SUPABASE_URL and SUPABASE_ANON_KEY are set in your .env file")
 
+# Optionally feed /api/notes/stream from Supabase Realtime (NOTES_REALTIME=supabase)
+events.configure_from_env()
+write_behind.configure_from_env()
+agenda.configure_from_env()
+semantic.configure_from_env()
+
+# Static files are loaded into memory once, hashed and precompressed
+static_assets = StaticAssets(app.static_folder)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    if app.static_folder is None:
+        return "Static folder not configured", 404
+
+    response = static_assets.serve(path)
+    if response is None:
+        return "index.html not found", 404
+    return response
 
+# Opt-in request profiling (PROFILE_ADMIN_TOKEN / PROFILE_SAMPLE_RATE), must run
+# after every route is registered
+profiler = profiling.install(app)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
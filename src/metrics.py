@@ -0,0 +1,217 @@
+"""Lightweight in-process latency metrics.
+
+Durations are recorded into fixed-bucket histograms (one ``bisect`` and a few
+additions per observation) and exported in the Prometheus text format at
+``/metrics``. Dependency timings recorded while a request is being handled are
+also reported back to the client in a ``Server-Timing`` header.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, request
+
+# Upper bounds in seconds, roughly log-spaced from 1ms to 60s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Dependency timings collected for the request currently being handled
+_request_timings = ContextVar('request_timings', default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram with error counting"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the matching bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, bucket_count in enumerate(self.counts):
+            upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return BUCKETS[-1]
+
+
+class Registry:
+    """Histograms keyed by metric name and label values"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._sampled = {}   # (name, labels) -> (func, help text, type)
+        self._lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def gauge(self, name, func, help_text='', **labels):
+        """Register a callable that is sampled at export time"""
+        self._sample(name, func, help_text, 'gauge', labels)
+
+    def counter(self, name, func, help_text='', **labels):
+        """Register a callable returning a running total, sampled at export time"""
+        self._sample(name, func, help_text, 'counter', labels)
+
+    def _sample(self, name, func, help_text, kind, labels):
+        with self._lock:
+            self._sampled[(name, tuple(sorted(labels.items())))] = (func, help_text, kind)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        by_name = {}
+        for (name, labels), histogram in list(self._histograms.items()):
+            by_name.setdefault(name, []).append((labels, histogram))
+
+        for name, series in sorted(by_name.items()):
+            lines.append(f'# TYPE {name} histogram')
+            for labels, h in series:
+                cumulative = 0
+                for index, bound in enumerate(BUCKETS):
+                    cumulative += h.counts[index]
+                    lines.append(f'{name}_bucket{_labels(labels, le=_num(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {h.count}')
+                lines.append(f'{name}_sum{_labels(labels)} {_num(h.sum)}')
+                lines.append(f'{name}_count{_labels(labels)} {h.count}')
+
+            lines.append(f'# TYPE {name}_quantile gauge')
+            for labels, h in series:
+                for q in QUANTILES:
+                    lines.append(f'{name}_quantile{_labels(labels, quantile=_num(q))} {_num(h.quantile(q))}')
+
+            errors_name = name.replace('_duration_seconds', '') + '_errors_total'
+            lines.append(f'# TYPE {errors_name} counter')
+            for labels, h in series:
+                lines.append(f'{errors_name}{_labels(labels)} {h.errors}')
+
+        sampled = {}
+        for (name, labels), (func, help_text, kind) in list(self._sampled.items()):
+            sampled.setdefault(name, (help_text, kind, []))[2].append((labels, func))
+        for name, (help_text, kind, series) in sorted(sampled.items()):
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, func in series:
+                try:
+                    value = func()
+                except Exception:
+                    continue
+                lines.append(f'{name}{_labels(labels)} {_num(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+registry = Registry()
+
+
+@contextmanager
+def track(dependency, operation):
+    """Time a call to an external dependency (Supabase, LLM, ...)
+
+    Usage:
+        with track('supabase', 'notes.select'):
+            result = query.execute()
+    """
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.histogram('dependency_duration_seconds', dependency=dependency, operation=operation).observe(
+            elapsed, error)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((dependency, elapsed))
+
+
+def instrument_blueprint(bp):
+    """Attach request timing and Server-Timing headers to every route of ``bp``"""
+
+    @bp.before_request
+    def _start_timer():
+        request.environ['metrics.start'] = time.perf_counter()
+        request.environ['metrics.token'] = _request_timings.set([])
+
+    @bp.after_request
+    def _record_timing(response):
+        start = request.environ.pop('metrics.start', None)
+        token = request.environ.pop('metrics.token', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        timings = _request_timings.get() or []
+        if token is not None:
+            try:
+                _request_timings.reset(token)
+            except ValueError:
+                # Token was created in another context (e.g. an async view)
+                pass
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        registry.histogram('http_request_duration_seconds', method=request.method, route=route).observe(
+            elapsed, response.status_code >= 500)
+        response.headers['Server-Timing'] = server_timing(elapsed, timings)
+        return response
+
+    return bp
+
+
+def server_timing(total, timings):
+    """Format a Server-Timing header value, aggregating time per dependency"""
+    totals = {}
+    for dependency, seconds in timings:
+        count, duration = totals.get(dependency, (0, 0.0))
+        totals[dependency] = (count + 1, duration + seconds)
+    parts = [f'app;dur={total * 1000:.1f}']
+    for dependency, (count, duration) in totals.items():
+        parts.append(f'{dependency};dur={duration * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"')
+    return ', '.join(parts)
+
+
+def metrics_view():
+    """Expose collected metrics for Prometheus scraping"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -1,102 +1,577 @@
-from src.config import supabase
+from src.config import supabase, get_async_postgrest
+from src.metrics import track
+from src import agenda, events, semantic, write_behind
+from src.models.revision import NoteRevision
+from src.models.tag import MAX_TAG_LENGTH, NoteTag
+from src.revisions import VERSIONED_FIELDS
 from datetime import datetime
+from postgrest.exceptions import APIError
 import json
+import re
+
+try:
+    import msgpack
+except ImportError:  # optional, enables the msgpack wire format
+    msgpack = None
+
+# Wire formats for note lists: name -> mimetype
+FORMATS = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.notes.columnar+json',
+}
+if msgpack is not None:
+    FORMATS['msgpack'] = 'application/x-msgpack'
+
+# Fields whose stored value is remembered, so updates write only what changed
+STORED_FIELDS = VERSIONED_FIELDS + ('order',)
 
 class Note:
+    # Fields of to_dict(), in wire order
+    FIELDS = ('id', 'user_id', 'title', 'content', 'order', 'tags',
+              'event_date', 'event_time', 'event_at', 'created_at', 'updated_at')
+    
     def __init__(self, **kwargs):
         self.id = kwargs.get('id')
+        self.user_id = kwargs.get('user_id')
         self.title = kwargs.get('title', '')
         self.content = kwargs.get('content', '')
         self.order = kwargs.get('order', 0)
         self.tags = kwargs.get('tags')
         self.event_date = kwargs.get('event_date')
         self.event_time = kwargs.get('event_time')
+        self.event_at = kwargs.get('event_at')
         self.created_at = kwargs.get('created_at')
         self.updated_at = kwargs.get('updated_at')
+        # Position in the database's change sequence (set by a trigger, see /notes/changes)
+        self.sync_seq = kwargs.get('sync_seq')
+        # Stored fields as last read from or written to the database
+        self._stored = {field: kwargs.get(field) for field in STORED_FIELDS} if self.id else None
     
     def __repr__(self):
         return f'<Note {self.title}>'
     
+    @property
+    def tags(self):
+        """Tags as a list, parsed once from the stored JSON string"""
+        return self._tags
+    
+    @tags.setter
+    def tags(self, value):
+        self._tags = _parse_tags(value)
+    
+    def _tags_changed(self):
+        return _parse_tags((self._stored or {}).get('tags')) != self._tags
+    
+    @staticmethod
+    def scoped(builder, user_id):
+        """Restrict a query to one user's notes.
+
+        Notes without an owner (user_id NULL) form the shared partition used
+        by anonymous requests and single-user deployments.
+        """
+        if user_id is None:
+            return builder.is_('user_id', 'null')
+        return builder.eq('user_id', user_id)
+    
     @classmethod
-    def get_all(cls):
-        """Get all notes ordered by order desc, then updated_at desc"""
-        result = supabase.table('notes').select('*').order('order', desc=True).order('updated_at', desc=True).execute()
-        return [cls(**note) for note in result.data]
+    def get_all(cls, user_id=None):
+        """Get a user's notes ordered by order desc, then updated_at desc"""
+        with track('supabase', 'notes.get_all'):
+            result = cls.scoped(supabase.table('notes').select('*'), user_id).order('order', desc=True).order('updated_at', desc=True).execute()
+        return _buffered([cls(**note) for note in result.data])
     
     @classmethod
-    def get_by_id(cls, note_id):
-        """Get note by ID"""
-        result = supabase.table('notes').select('*').eq('id', note_id).execute()
+    def get_by_id(cls, note_id, user_id=None):
+        """Get one of a user's notes by ID"""
+        if write_behind.buffer is not None:
+            note = write_behind.buffer.get(note_id, user_id)
+            if note is not None:
+                return note
+        with track('supabase', 'notes.get_by_id'):
+            result = cls.scoped(supabase.table('notes').select('*').eq('id', note_id), user_id).execute()
         if result.data:
             return cls(**result.data[0])
         return None
     
     @classmethod
-    def search(cls, query):
-        """Search notes by title or content"""
-        # Using ilike for case-insensitive search
-        result = supabase.table('notes').select('*').or_(f'title.ilike.%{query}%,content.ilike.%{query}%').order('updated_at', desc=True).execute()
-        return [cls(**note) for note in result.data]
+    async def aget_by_id(cls, note_id, user_id=None):
+        """Get one of a user's notes by ID without blocking the event loop (for async views)"""
+        if write_behind.buffer is not None:
+            note = write_behind.buffer.get(note_id, user_id)
+            if note is not None:
+                return note
+        with track('supabase', 'notes.get_by_id'):
+            result = await cls.scoped(get_async_postgrest().from_('notes').select('*').eq('id', note_id), user_id).execute()
+        if result.data:
+            return cls(**result.data[0])
+        return None
+    
+    @classmethod
+    def search(cls, query, user_id=None):
+        """Search a user's notes by title or content"""
+        # Using ilike for case-insensitive search. The or= filter is added as a
+        # raw PostgREST parameter because the pinned postgrest-py has no or_(),
+        # so the pattern is double-quoted to keep , ( ) in the query literal
+        pattern = _quote_filter_value('%' + re.sub(r'([\\%_])', r'\\\1', query) + '%')
+        builder = cls.scoped(supabase.table('notes').select('*'), user_id)
+        builder.params = builder.params.add('or', f'(title.ilike.{pattern},content.ilike.{pattern})')
+        with track('supabase', 'notes.search'):
+            result = builder.order('updated_at', desc=True).execute()
+        needle = query.lower()
+        notes = _buffered([cls(**note) for note in result.data], user_id,
+                          lambda note: needle in (note.title or '').lower() or needle in (note.content or '').lower())
+        notes.sort(key=lambda note: note.updated_at or '', reverse=True)
+        return notes
+    
+    @classmethod
+    def semantic_search(cls, query, user_id=None, limit=20):
+        """Get a user's notes closest in meaning to ``query``, best match first.
+
+        Returns None while the vector index is still being built.
+        """
+        if semantic.index is None or not semantic.index.ready.is_set():
+            return None
+        matches = semantic.index.search(semantic.embed(query), user_id, limit)
+        notes = cls.get_many([note_id for note_id, _ in matches], user_id)
+        return [notes[note_id] for note_id, _ in matches if note_id in notes]
     
     @classmethod
-    def get_max_order(cls):
-        """Get the maximum order value"""
-        result = supabase.table('notes').select('order').order('order', desc=True).limit(1).execute()
+    def get_max_order(cls, user_id=None):
+        """Get the maximum order value among a user's notes"""
+        with track('supabase', 'notes.get_max_order'):
+            result = cls.scoped(supabase.table('notes').select('order'), user_id).order('order', desc=True).limit(1).execute()
         if result.data:
             return result.data[0]['order']
         return 0
     
-    def save(self):
-        """Save note to database"""
-        data = {
+    @classmethod
+    def next_order(cls, user_id=None, count=1):
+        """Reserve ``count`` order values for a user's next notes (placed first in the list).
+
+        Returns the highest reserved value; the reserved range ends there.
+        """
+        try:
+            # Per-user counter row, incremented atomically by next_note_order()
+            with track('supabase', 'notes.next_order'):
+                result = supabase.rpc('next_note_order', {'p_user_id': user_id, 'p_count': count}).execute()
+            if result.data:
+                return result.data[0]['next_order']
+        except APIError as e:
+            if e.code != 'PGRST202':
+                raise
+            # Function not installed yet, see SUPABASE_MIGRATION.md
+        return cls.get_max_order(user_id) + count
+    
+    @classmethod
+    def get_many(cls, note_ids, user_id=None):
+        """Get several of a user's notes in one query, keyed by id"""
+        note_ids = list(note_ids)
+        if not note_ids:
+            return {}
+        with track('supabase', 'notes.get_many'):
+            result = cls.scoped(supabase.table('notes').select('*').in_('id', note_ids), user_id).execute()
+        return {note.id: note for note in _buffered([cls(**note) for note in result.data])}
+    
+    @classmethod
+    def get_events(cls, start=None, end=None, user_id=None, limit=None):
+        """Get a user's notes with an event in [start, end), soonest first"""
+        if agenda.index is not None:
+            ids = agenda.index.range(user_id, start, end, limit)
+            notes = cls.get_many(ids, user_id)
+            return [notes[note_id] for note_id in ids if note_id in notes]
+        builder = cls.scoped(supabase.table('notes').select('*'), user_id).not_.is_('event_at', 'null')
+        if start:
+            builder = builder.gte('event_at', start)
+        if end:
+            builder = builder.lt('event_at', end)
+        builder = builder.order('event_at')
+        if limit is not None:
+            # Room for rows that buffered updates move out of the range
+            builder = builder.limit(limit + (len(write_behind.buffer) if write_behind.buffer is not None else 0))
+        with track('supabase', 'notes.get_events'):
+            result = builder.execute()
+        
+        def in_range(note):
+            at = note.event_at and agenda.normalize(note.event_at)
+            return bool(at) and (not start or at >= start) and (not end or at < end)
+        notes = _buffered([cls(**note) for note in result.data], user_id, in_range)
+        notes.sort(key=lambda note: agenda.normalize(note.event_at))
+        return notes[:limit]
+    
+    @classmethod
+    def get_event_rows(cls, page_size=1000):
+        """(id, user_id, event_at) of every note with an event, for the in-memory index"""
+        rows, offset = [], 0
+        while True:
+            with track('supabase', 'notes.get_event_rows'):
+                result = supabase.table('notes').select('id,user_id,event_at').not_.is_('event_at', 'null').order('id').limit(page_size).offset(offset).execute()
+            rows.extend(result.data)
+            if len(result.data) < page_size:
+                return rows
+            offset += page_size
+    
+    @classmethod
+    def get_rows(cls, columns='*', ids=None, page_size=1000):
+        """Rows of every user's notes (or of ``ids``), page by page, for the in-process indexes"""
+        offset = 0
+        while True:
+            builder = supabase.table('notes').select(columns)
+            if ids is not None:
+                builder = builder.in_('id', list(ids))
+            with track('supabase', 'notes.get_rows'):
+                result = builder.order('id').limit(page_size).offset(offset).execute()
+            yield from result.data
+            if len(result.data) < page_size:
+                return
+            offset += page_size
+    
+    @classmethod
+    def get_by_tags(cls, tags, user_id=None, match='all'):
+        """Get a user's notes tagged with all (or any) of ``tags``, in list order"""
+        wanted = set(tags)
+        notes = _buffered(list(cls.get_many(NoteTag.note_ids(tags, user_id, match), user_id).values()), user_id,
+                          lambda note: wanted & set(note.tags) if match == 'any' else wanted <= set(note.tags))
+        notes.sort(key=lambda note: note.updated_at or '', reverse=True)
+        notes.sort(key=lambda note: note.order or 0, reverse=True)
+        return notes
+    
+    @classmethod
+    def insert_many(cls, notes):
+        """Insert new notes with a single multi-row insert"""
+        if not notes:
+            return []
+        with track('supabase', 'notes.insert_many'):
+            result = supabase.table('notes').insert([note.to_row() for note in notes]).execute()
+        # Rows come back in the order they were sent
+        cls._saved_many(list(zip(notes, result.data)))
+        NoteTag.replace([note for note in notes if note.tags])
+        return notes
+    
+    @classmethod
+    def update_many(cls, notes, publish=True, from_buffer=False):
+        """Write the changed fields of existing notes with a single UPDATE.
+
+        Notes deleted in the meantime are skipped rather than written back.
+        Returns the notes that were written or had nothing to write.
+        """
+        if not notes:
+            return []
+        if write_behind.buffer is not None and not from_buffer:
+            # The rows written here supersede any buffered update
+            for note in notes:
+                write_behind.buffer.discard(note.id)
+        retagged = [note for note in notes if note._tags_changed()]
+        rows, unchanged = [], []
+        for note in notes:
+            changes = note.changed_row()
+            if changes:
+                rows.append(dict(changes, id=note.id, user_id=note.user_id))
+            else:
+                unchanged.append(note)
+        rows = {row['id']: row for row in cls._update_rows(rows)}
+        cls._saved_many([(note, rows[note.id]) for note in notes if note.id in rows], publish)
+        NoteTag.replace([note for note in retagged if note.id in rows])
+        return [note for note in notes if note.id in rows] + unchanged
+    
+    @classmethod
+    def _update_rows(cls, rows):
+        """UPDATE notes by id and owner, setting only the columns present in each row.
+
+        Uses the update_notes() function (one statement, so all rows or none),
+        or one PATCH per row until it is installed. Returns the updated rows.
+        """
+        if not rows:
+            return []
+        try:
+            with track('supabase', 'notes.update_many'):
+                return supabase.rpc('update_notes', {'p_rows': rows}).execute().data
+        except APIError as e:
+            if e.code != 'PGRST202':
+                raise
+        # Function not installed yet, see SUPABASE_MIGRATION.md
+        updated = []
+        for row in rows:
+            changes = {column: value for column, value in row.items() if column not in ('id', 'user_id')}
+            with track('supabase', 'notes.update'):
+                result = cls.scoped(supabase.table('notes').update(changes).eq('id', row['id']), row['user_id']).execute()
+            updated.extend(result.data)
+        return updated
+    
+    @classmethod
+    def delete_many(cls, note_ids, user_id=None):
+        """Delete several of a user's notes with one delete and one tombstone insert.
+
+        Returns the ids that were actually deleted.
+        """
+        note_ids = list(note_ids)
+        if not note_ids:
+            return []
+        if write_behind.buffer is not None:
+            for note_id in note_ids:
+                write_behind.buffer.discard(note_id)
+        with track('supabase', 'notes.delete_many'):
+            result = cls.scoped(supabase.table('notes').delete().in_('id', note_ids), user_id).execute()
+        deleted = [row['id'] for row in result.data]
+        if deleted:
+            deleted_at = datetime.utcnow().isoformat()
+            with track('supabase', 'note_tombstones.insert'):
+                supabase.table('note_tombstones').insert([
+                    {'note_id': note_id, 'user_id': user_id, 'deleted_at': deleted_at} for note_id in deleted
+                ]).execute()
+            for note_id in deleted:
+                cls._unindex(note_id)
+                events.publish('delete', {'id': note_id}, user_id=user_id)
+        return deleted
+    
+    def to_row(self):
+        """Column values written to the notes table"""
+        return {
+            'user_id': self.user_id,
             'title': self.title,
             'content': self.content,
             'order': self.order,
-            'tags': json.dumps(self.tags) if self.tags is not None else None,
+            'tags': json.dumps(self.tags) if self.tags else None,
             'event_date': self.event_date,
             'event_time': self.event_time,
-            'updated_at': datetime.utcnow().isoformat()
+            'event_at': agenda.event_at(self.event_date, self.event_time),
+            # updated_at is the edit time shown to users, so reorders keep it
+            'updated_at': datetime.utcnow().isoformat() if self._edited() else self.updated_at
         }
+    
+    def changed_row(self):
+        """Columns of to_row() whose value changed since the note was read (all of them for new notes)"""
+        row = self.to_row()
+        if self._stored is None:
+            return row
+        state, stored = self.revision_state(), self.revision_state(self._stored)
+        changes = {field: row[field] for field in VERSIONED_FIELDS if state[field] != stored[field]}
+        if changes:
+            changes['event_at'] = row['event_at']
+            changes['updated_at'] = row['updated_at']
+        if self.order != self._stored['order']:
+            changes['order'] = self.order
+        return changes
+    
+    def _edited(self):
+        """Whether versioned fields differ from the stored row (always true for new notes)"""
+        return self._stored is None or self.revision_state(self._stored) != self.revision_state()
+    
+    def save(self):
+        """Save note to database"""
+        if self.id and write_behind.buffer is not None:
+            # Acknowledged from memory, written by the buffer's next flush
+            self.event_at = agenda.event_at(self.event_date, self.event_time)
+            write_behind.buffer.put(self)
+            self._update_indexes()
+            events.publish('upsert', self.to_dict(), user_id=self.user_id)
+            return self
+        
+        data = self.to_row()
+        retagged = self._tags_changed()
         
         if self.id:
             # Update existing note
-            result = supabase.table('notes').update(data).eq('id', self.id).execute()
-            if result.data:
-                updated_note = self.__class__(**result.data[0])
-                self.__dict__.update(updated_note.__dict__)
-                return self
+            with track('supabase', 'notes.save'):
+                result = self.scoped(supabase.table('notes').update(data).eq('id', self.id), self.user_id).execute()
         else:
             # Create new note
-            result = supabase.table('notes').insert(data).execute()
-            if result.data:
-                new_note = self.__class__(**result.data[0])
-                self.__dict__.update(new_note.__dict__)
-                return self
+            with track('supabase', 'notes.save'):
+                result = supabase.table('notes').insert(data).execute()
+        if result.data:
+            self._saved_many([(self, result.data[0])])
+            if retagged:
+                NoteTag.replace([self])
+            return self
         return None
     
+    @classmethod
+    def _saved_many(cls, written, publish=True):
+        """Take over the rows returned by a write, record history and notify subscribers.
+
+        ``written`` is a list of (note, row) pairs; the revisions of all of
+        them are recorded together.
+        """
+        states, new_ids = {}, set()
+        for note, row in written:
+            previous = note.revision_state(note._stored) if note._stored is not None else None
+            created = note.id is None
+            note.__dict__.update(cls(**row).__dict__)
+            state = note.revision_state()
+            note._update_indexes(previous)
+            if state != previous:
+                states[note.id] = state
+            if created:
+                new_ids.add(note.id)
+        if states:
+            try:
+                NoteRevision.record_many(states, new_ids)
+            except Exception as e:
+                # History is best effort, the notes themselves are saved
+                print(f"✗ Failed to record revisions for notes {sorted(states)}: {e}")
+        if publish:
+            for note, _ in written:
+                events.publish('upsert', note.to_dict(), user_id=note.user_id)
+    
+    def _update_indexes(self, previous=None):
+        """Update the in-process indexes; ``previous`` revision state skips unchanged text"""
+        if agenda.index is not None:
+            agenda.index.update(self.id, self.user_id, self.event_at)
+        if semantic.index is not None:
+            state = self.revision_state()
+            changed = previous is None or any(previous[field] != state[field] for field in semantic.FIELDS)
+            semantic.index.update_note(self, changed)
+    
+    @staticmethod
+    def _unindex(note_id):
+        NoteTag.forget(note_id)
+        if agenda.index is not None:
+            agenda.index.remove(note_id)
+        if semantic.index is not None:
+            semantic.index.remove(note_id)
+    
+    def revision_state(self, values=None):
+        """Versioned fields (see src/revisions.py), from ``values`` or the note itself"""
+        if values is None:
+            values = {field: getattr(self, field) for field in VERSIONED_FIELDS}
+        state = {field: values[field] for field in VERSIONED_FIELDS}
+        state['tags'] = _parse_tags(state['tags'])
+        return state
+    
+    def get_revisions(self):
+        """This note's revision history, newest first"""
+        return NoteRevision.get_for_note(self.id)
+    
+    def get_revision(self, revision):
+        """Versioned fields of this note as of ``revision``, or None"""
+        return NoteRevision.rebuild(self.id, revision)
+    
     def delete(self):
-        """Delete note from database"""
+        """Delete note from database, leaving a tombstone for delta sync"""
         if self.id:
-            supabase.table('notes').delete().eq('id', self.id).execute()
+            if write_behind.buffer is not None:
+                write_behind.buffer.discard(self.id)
+            with track('supabase', 'notes.delete'):
+                self.scoped(supabase.table('notes').delete().eq('id', self.id), self.user_id).execute()
+            with track('supabase', 'note_tombstones.insert'):
+                supabase.table('note_tombstones').insert({
+                    'note_id': self.id,
+                    'user_id': self.user_id,
+                    'deleted_at': datetime.utcnow().isoformat()
+                }).execute()
+            self._unindex(self.id)
+            events.publish('delete', {'id': self.id}, user_id=self.user_id)
             return True
         return False
     
     @classmethod
-    def update_orders(cls, id_order_pairs):
-        """Bulk update note orders"""
-        for note_id, order_value in id_order_pairs:
-            supabase.table('notes').update({'order': order_value}).eq('id', note_id).execute()
+    def update_orders(cls, id_order_pairs, user_id=None):
+        """Bulk update the order of a user's notes, writing only the order column"""
+        id_order_pairs = [(int(note_id), order_value) for note_id, order_value in id_order_pairs]
+        rows = cls._update_rows([{'id': note_id, 'user_id': user_id, 'order': order_value}
+                                 for note_id, order_value in id_order_pairs])
+        if write_behind.buffer is not None:
+            for row in rows:
+                write_behind.buffer.set_order(row['id'], row['order'])
+        # The sync_seq trigger moves reordered notes into /notes/changes
+        events.publish('reorder', {'order': [[row['id'], row['order']] for row in rows]}, user_id=user_id)
+    
+    @classmethod
+    def sync_horizon(cls):
+        """Oldest transaction id still running: writes of every older one are committed and visible"""
+        with track('supabase', 'note_sync_horizon'):
+            return supabase.rpc('note_sync_horizon', {}).execute().data[0]['horizon']
+    
+    @classmethod
+    def get_changes(cls, since, user_id=None):
+        """Get a user's notes written and ids deleted by transaction ``since`` or later.
+
+        ``since`` is a sync_horizon(), so a write may be returned again by the
+        next call. Returns (notes, deleted) where deleted is a list of
+        {'note_id': ..., 'deleted_at': ..., 'sync_seq': ...} tombstones.
+        """
+        with track('supabase', 'notes.get_changes'):
+            notes = cls.scoped(supabase.table('notes').select('*'), user_id).gte('sync_txid', since).order('sync_seq').execute()
+        with track('supabase', 'note_tombstones.get_changes'):
+            tombstones = cls.scoped(supabase.table('note_tombstones').select('note_id,deleted_at,sync_seq'), user_id).gte('sync_txid', since).order('sync_seq').execute()
+        notes = _buffered([cls(**note) for note in notes.data])
+        if write_behind.buffer is not None:
+            # Buffered updates have no position until they are flushed, so they
+            # are sent on every call until then
+            seen = {note.id for note in notes}
+            notes += [note for note in write_behind.buffer.pending_for(user_id) if note.id not in seen]
+        return notes, tombstones.data
+    
+    @classmethod
+    def to_columns(cls, notes):
+        """Columnar form of a note list: field names once, then one array per field"""
+        rows = [note.to_dict() for note in notes]
+        return {
+            'fields': list(cls.FIELDS),
+            'count': len(rows),
+            'columns': [[row[field] for row in rows] for field in cls.FIELDS]
+        }
+    
+    @classmethod
+    def serialize(cls, notes, fmt='json'):
+        """Encode a note list in one of FORMATS, returning (body, mimetype)"""
+        if fmt == 'json':
+            body = json.dumps([note.to_dict() for note in notes], separators=(',', ':'))
+        elif fmt == 'columnar':
+            body = json.dumps(cls.to_columns(notes), separators=(',', ':'))
+        elif fmt == 'msgpack' and msgpack is not None:
+            body = msgpack.packb(cls.to_columns(notes))
+        else:
+            raise ValueError(f'Unsupported format {fmt!r}')
+        return body, FORMATS[fmt]
     
     def to_dict(self):
         return {
             'id': self.id,
+            'user_id': self.user_id,
             'title': self.title,
             'content': self.content,
             'order': self.order,
-            'tags': [] if not self.tags else (json.loads(self.tags) if isinstance(self.tags, str) else self.tags),
+            'tags': list(self.tags),
             'event_date': self.event_date,
             'event_time': self.event_time,
+            'event_at': self.event_at,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
 
+
+def _quote_filter_value(value):
+    """Double-quote a value for a raw PostgREST filter, escaping quotes and backslashes"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _parse_tags(tags):
+    """Tags as a list, from a list, a stored JSON string or comma-separated text"""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        try:
+            loaded = json.loads(tags)
+        except ValueError:
+            loaded = tags.split(',')
+        if loaded is None:
+            return []
+        # Other JSON scalars ("2024", "true") are a single tag, as typed
+        tags = loaded if isinstance(loaded, list) else [loaded if isinstance(loaded, str) else tags]
+    elif not isinstance(tags, (list, tuple)):
+        tags = [tags]
+    tags = (str(tag).strip()[:MAX_TAG_LENGTH].strip() for tag in tags if tag is not None)
+    return [tag for tag in tags if tag]
+
+
+def _buffered(notes, user_id=None, matches=None):
+    """Apply updates still waiting in the write-behind buffer.
+
+    ``matches`` is the filter of the query that read ``notes``, checked
+    against buffered state (see WriteBehindBuffer.merge).
+    """
+    if write_behind.buffer is None:
+        return notes
+    if matches is None:
+        return write_behind.buffer.overlay(notes)
+    return write_behind.buffer.merge(notes, user_id, matches)
@@ -0,0 +1,164 @@
+from src.config import supabase
+from src.metrics import track
+from src import revisions
+from datetime import datetime, timedelta
+from postgrest.exceptions import APIError
+import json
+
+# Saves within this many seconds of a revision's creation are folded into it
+REVISION_WINDOW = 60
+# Every Nth revision is a full snapshot, bounding how many deltas a rebuild replays
+SNAPSHOT_INTERVAL = 20
+
+SNAPSHOT = 'snapshot'
+DELTA = 'delta'
+
+class NoteRevision:
+    def __init__(self, **kwargs):
+        self.id = kwargs.get('id')
+        self.note_id = kwargs.get('note_id')
+        self.revision = kwargs.get('revision')
+        self.kind = kwargs.get('kind')
+        data = kwargs.get('data')
+        self.data = json.loads(data) if isinstance(data, str) else data
+        self.created_at = kwargs.get('created_at')
+        self.updated_at = kwargs.get('updated_at')
+
+    def __repr__(self):
+        return f'<NoteRevision {self.note_id}@{self.revision}>'
+
+    def to_entry(self):
+        return {'revision': self.revision, 'kind': self.kind, 'data': self.data}
+
+    @classmethod
+    def get_for_note(cls, note_id):
+        """Get a note's revisions, newest first, without rebuilding them"""
+        with track('supabase', 'note_revisions.get_for_note'):
+            result = supabase.table('note_revisions').select('*').eq('note_id', note_id).order('revision', desc=True).execute()
+        return [cls(**row) for row in result.data]
+
+    @classmethod
+    def get_chain(cls, note_id, revision=None):
+        """Get the revisions needed to rebuild ``revision`` (default: the newest).
+
+        Snapshots are at most SNAPSHOT_INTERVAL revisions apart, so the
+        nearest one is always within the last SNAPSHOT_INTERVAL rows.
+        """
+        builder = supabase.table('note_revisions').select('*').eq('note_id', note_id)
+        if revision is not None:
+            builder = builder.lte('revision', revision)
+        with track('supabase', 'note_revisions.get_chain'):
+            result = builder.order('revision', desc=True).limit(SNAPSHOT_INTERVAL).execute()
+        return [cls(**row) for row in result.data]
+
+    @classmethod
+    def rebuild(cls, note_id, revision):
+        """Rebuild one revision of a note by replaying deltas from the nearest snapshot"""
+        chain = cls.get_chain(note_id, revision)
+        if not chain or chain[0].revision != revision:
+            return None
+        return revisions.rebuild([entry.to_entry() for entry in chain])
+
+    @classmethod
+    def get_chains(cls, note_ids):
+        """Newest chains of several notes (revisions from the newest snapshot on), keyed by note id.
+
+        One call of note_revision_heads(), or one get_chain() per note until
+        that function is installed.
+        """
+        chains = {note_id: [] for note_id in note_ids}
+        if not chains:
+            return chains
+        try:
+            with track('supabase', 'note_revisions.get_chains'):
+                result = supabase.rpc('note_revision_heads', {'p_note_ids': list(chains)}).execute()
+        except APIError as e:
+            if e.code != 'PGRST202':
+                raise
+            # Function not installed yet, see SUPABASE_MIGRATION.md
+            return {note_id: cls.get_chain(note_id) for note_id in chains}
+        for row in result.data:
+            chains[row['note_id']].append(cls(**row))
+        for chain in chains.values():
+            chain.sort(key=lambda entry: entry.revision, reverse=True)
+        return chains
+
+    @classmethod
+    def record_many(cls, states, new_ids=()):
+        """Record the newest revision of several notes (note id -> state).
+
+        Chains are read with one query (skipped for ``new_ids``, notes just
+        created), new revisions written with one insert and coalesced ones
+        with one upsert. Consecutive saves within REVISION_WINDOW of a note's
+        newest revision rewrite it instead of adding a new one.
+        """
+        now = datetime.utcnow()
+        chains = cls.get_chains([note_id for note_id in states if note_id not in new_ids])
+        inserts, updates = [], []
+        for note_id, state in states.items():
+            chain = chains.get(note_id, [])
+            if not chain:
+                inserts.append(cls._row(note_id, 1, SNAPSHOT, state, now))
+                continue
+
+            latest = chain[0]
+            entries = [entry.to_entry() for entry in chain]
+            if revisions.rebuild(entries) == state:
+                continue
+
+            created_at = datetime.fromisoformat(latest.created_at) if latest.created_at else now
+            if now - created_at < timedelta(seconds=REVISION_WINDOW):
+                # Coalesce: rewrite the newest revision against its predecessor
+                if latest.kind == SNAPSHOT:
+                    kind, data = SNAPSHOT, state
+                else:
+                    kind, data = cls._encode(revisions.rebuild(entries, latest.revision - 1), state)
+                row = cls._row(note_id, latest.revision, kind, data, now)
+                updates.append(dict(row, id=latest.id, created_at=latest.created_at))
+                continue
+
+            revision = latest.revision + 1
+            if (revision - 1) % SNAPSHOT_INTERVAL == 0:
+                inserts.append(cls._row(note_id, revision, SNAPSHOT, state, now))
+            else:
+                kind, data = cls._encode(revisions.rebuild(entries), state)
+                inserts.append(cls._row(note_id, revision, kind, data, now))
+
+        recorded = []
+        if inserts:
+            with track('supabase', 'note_revisions.insert'):
+                recorded += supabase.table('note_revisions').insert(inserts).execute().data
+        if updates:
+            with track('supabase', 'note_revisions.update'):
+                recorded += supabase.table('note_revisions').upsert(updates, on_conflict='id').execute().data
+        return [cls(**row) for row in recorded]
+
+    @staticmethod
+    def _encode(base, state):
+        """Delta from ``base`` to ``state``, or a snapshot when that is not smaller"""
+        if base is None:
+            return SNAPSHOT, state
+        delta = revisions.make_delta(base, state)
+        if len(json.dumps(delta)) >= len(json.dumps(state)):
+            return SNAPSHOT, state
+        return DELTA, delta
+
+    @staticmethod
+    def _row(note_id, revision, kind, data, now):
+        return {
+            'note_id': note_id,
+            'revision': revision,
+            'kind': kind,
+            'data': json.dumps(data),
+            'created_at': now.isoformat(),
+            'updated_at': now.isoformat()
+        }
+
+    def to_dict(self):
+        return {
+            'revision': self.revision,
+            'kind': self.kind,
+            'size': len(json.dumps(self.data)),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
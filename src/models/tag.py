@@ -0,0 +1,77 @@
+from src.config import supabase
+from src.metrics import track
+import threading
+
+# Length of the note_tags.tag column; longer tags are cut to fit
+MAX_TAG_LENGTH = 100
+
+class NoteTag:
+    """Normalized (note, tag) index behind tag counts and tag filtering.
+
+    Rows are rewritten whenever a note's tags change and removed with the
+    note by ON DELETE CASCADE, so tag queries never read note bodies.
+    """
+
+    # note id -> note whose index rows could not be written, retried by the next replace()
+    _repairs = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def scoped(builder, user_id):
+        if user_id is None:
+            return builder.is_('user_id', 'null')
+        return builder.eq('user_id', user_id)
+
+    @classmethod
+    def replace(cls, notes):
+        """Rewrite the index rows of ``notes`` with one delete and one insert.
+
+        Called after the notes are saved, so failures are not raised: they
+        are logged and the notes are rewritten again with the next call.
+        """
+        with cls._lock:
+            pending, cls._repairs = cls._repairs, {}
+        pending.update((note.id, note) for note in notes)
+        if not pending:
+            return
+        try:
+            with track('supabase', 'note_tags.delete'):
+                supabase.table('note_tags').delete().in_('note_id', list(pending)).execute()
+            rows = [{'note_id': note.id, 'user_id': note.user_id, 'tag': tag}
+                    for note in pending.values() for tag in dict.fromkeys(note.tags)]
+            if rows:
+                # Rows written by a concurrent replace of the same note are already there
+                with track('supabase', 'note_tags.insert'):
+                    supabase.table('note_tags').upsert(rows, returning='minimal', ignore_duplicates=True,
+                                                       on_conflict='note_id,tag').execute()
+        except Exception as e:
+            with cls._lock:
+                for note_id, note in pending.items():
+                    cls._repairs.setdefault(note_id, note)
+            print(f"✗ Failed to update the tag index of {len(pending)} notes, will retry: {e}")
+
+    @classmethod
+    def forget(cls, note_id):
+        """Drop a pending repair of a deleted note"""
+        with cls._lock:
+            cls._repairs.pop(note_id, None)
+
+    @classmethod
+    def counts(cls, user_id=None):
+        """A user's tags with the number of notes carrying each, most used first"""
+        with track('supabase', 'tag_counts.get'):
+            result = cls.scoped(supabase.table('tag_counts').select('tag,count'), user_id).order('count', desc=True).order('tag').execute()
+        return result.data
+
+    @classmethod
+    def note_ids(cls, tags, user_id=None, match='all'):
+        """Ids of a user's notes tagged with all (or any) of ``tags``"""
+        tags = list(dict.fromkeys(tags))
+        with track('supabase', 'note_tags.note_ids'):
+            result = cls.scoped(supabase.table('note_tags').select('note_id,tag'), user_id).in_('tag', tags).execute()
+        matches = {}
+        for row in result.data:
+            matches.setdefault(row['note_id'], set()).add(row['tag'])
+        if match == 'any':
+            return list(matches)
+        return [note_id for note_id, found in matches.items() if len(found) == len(tags)]
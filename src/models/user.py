@@ -1,4 +1,5 @@
 from src.config import supabase
+from src.metrics import track
 from datetime import datetime
 
 class User:
@@ -15,13 +16,15 @@ class User:
     @classmethod
     def get_all(cls):
         """Get all users"""
-        result = supabase.table('users').select('*').order('created_at', desc=True).execute()
+        with track('supabase', 'users.get_all'):
+            result = supabase.table('users').select('*').order('created_at', desc=True).execute()
         return [cls(**user) for user in result.data]
     
     @classmethod
     def get_by_id(cls, user_id):
         """Get user by ID"""
-        result = supabase.table('users').select('*').eq('id', user_id).execute()
+        with track('supabase', 'users.get_by_id'):
+            result = supabase.table('users').select('*').eq('id', user_id).execute()
         if result.data:
             return cls(**result.data[0])
         return None
@@ -29,7 +32,8 @@ class User:
     @classmethod
     def get_by_username(cls, username):
         """Get user by username"""
-        result = supabase.table('users').select('*').eq('username', username).execute()
+        with track('supabase', 'users.get_by_username'):
+            result = supabase.table('users').select('*').eq('username', username).execute()
         if result.data:
             return cls(**result.data[0])
         return None
@@ -37,7 +41,8 @@ class User:
     @classmethod
     def get_by_email(cls, email):
         """Get user by email"""
-        result = supabase.table('users').select('*').eq('email', email).execute()
+        with track('supabase', 'users.get_by_email'):
+            result = supabase.table('users').select('*').eq('email', email).execute()
         if result.data:
             return cls(**result.data[0])
         return None
@@ -52,14 +57,16 @@ class User:
         
         if self.id:
             # Update existing user
-            result = supabase.table('users').update(data).eq('id', self.id).execute()
+            with track('supabase', 'users.save'):
+                result = supabase.table('users').update(data).eq('id', self.id).execute()
             if result.data:
                 updated_user = self.__class__(**result.data[0])
                 self.__dict__.update(updated_user.__dict__)
                 return self
         else:
             # Create new user
-            result = supabase.table('users').insert(data).execute()
+            with track('supabase', 'users.save'):
+                result = supabase.table('users').insert(data).execute()
             if result.data:
                 new_user = self.__class__(**result.data[0])
                 self.__dict__.update(new_user.__dict__)
@@ -69,7 +76,8 @@ class User:
     def delete(self):
         """Delete user from database"""
         if self.id:
-            supabase.table('users').delete().eq('id', self.id).execute()
+            with track('supabase', 'users.delete'):
+                supabase.table('users').delete().eq('id', self.id).execute()
             return True
         return False
     
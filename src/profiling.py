@@ -0,0 +1,295 @@
+"""On-demand request profiling.
+
+Profiling is opt-in and configured through environment variables:
+
+    PROFILE_ADMIN_TOKEN   requests sending ``X-Profile: <token>`` are profiled,
+                          the same token protects the /admin/profiles endpoints
+    PROFILE_SAMPLE_RATE   fraction (0-1) of requests profiled automatically
+    PROFILE_MODE          'deterministic' (cProfile, default) or 'sampling'
+    PROFILE_BUFFER_SIZE   number of profiles kept in memory (default 20)
+
+When neither a token nor a sample rate is configured ``install`` does not wrap
+anything, so there is no per-request overhead. Profiles can be downloaded as
+pstats files (deterministic mode, open with ``python -m pstats`` or snakeviz)
+or collapsed stacks (sampling mode, feed to flamegraph.pl or speedscope).
+Async views are profiled on the shared event loop thread, only while their
+own coroutine is running.
+"""
+import cProfile
+import functools
+import hmac
+import inspect
+import itertools
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import Response, abort, jsonify, request
+
+DETERMINISTIC = 'deterministic'
+SAMPLING = 'sampling'
+
+# Interval between stack samples in sampling mode
+SAMPLE_INTERVAL = 0.005
+
+
+class ProfileRecord:
+    def __init__(self, profile_id, mode, duration, data):
+        self.id = profile_id
+        self.mode = mode
+        self.duration = duration
+        self.data = data
+        self.endpoint = request.endpoint
+        self.method = request.method
+        self.path = request.path
+        self.view_args = dict(request.view_args or {})
+        self.query_args = request.args.to_dict(flat=False)
+        self.created_at = datetime.utcnow().isoformat()
+
+    @property
+    def formats(self):
+        return ['pstats'] if self.mode == DETERMINISTIC else ['collapsed']
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'path': self.path,
+            'view_args': self.view_args,
+            'query_args': self.query_args,
+            'duration_ms': round(self.duration * 1000, 2),
+            'created_at': self.created_at,
+            'downloads': [f'/admin/profiles/{self.id}.{fmt}' for fmt in self.formats],
+        }
+
+
+class StackSampler:
+    """Low-overhead sampling profiler for a single thread.
+
+    A background thread periodically captures the target thread's stack and
+    counts identical stacks, producing collapsed-stack output. Sampling is
+    paused while ``thread_id`` is None.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.thread_id is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common()) + '\n'
+
+
+@types.coroutine
+def _stepped(coro, resume, pause):
+    """Drive ``coro``, calling ``resume``/``pause`` around each of its steps.
+
+    On the shared loop other requests run between the steps, so this keeps
+    them out of the profile.
+    """
+    value, error = None, None
+    while True:
+        resume()
+        try:
+            yielded = coro.throw(error) if error is not None else coro.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            pause()
+        try:
+            value, error = (yield yielded), None
+        except BaseException as e:
+            value, error = None, e
+
+
+class Profiler:
+    """Decides which requests to profile and keeps the most recent results"""
+
+    def __init__(self, token=None, sample_rate=0.0, mode=DETERMINISTIC, buffer_size=20):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.profiles = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            token=os.environ.get('PROFILE_ADMIN_TOKEN') or None,
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0') or 0),
+            mode=os.environ.get('PROFILE_MODE', DETERMINISTIC),
+            buffer_size=int(os.environ.get('PROFILE_BUFFER_SIZE', '20')),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_rate > 0
+
+    def _has_token(self):
+        sent = request.headers.get('X-Profile')
+        return bool(self.token) and sent is not None and hmac.compare_digest(sent.encode(), self.token.encode())
+
+    def should_profile(self):
+        if self._has_token():
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def wrap(self, view):
+        @functools.wraps(view)
+        def profiled_view(*args, **kwargs):
+            if not self.should_profile():
+                return view(*args, **kwargs)
+            mode = request.headers.get('X-Profile-Mode', self.mode)
+            if mode == SAMPLING:
+                return self._run_sampled(view, args, kwargs)
+            return self._run_deterministic(view, args, kwargs)
+        return profiled_view
+
+    def wrap_async(self, view):
+        @functools.wraps(view)
+        async def profiled_view(*args, **kwargs):
+            if not self.should_profile():
+                return await view(*args, **kwargs)
+            mode = request.headers.get('X-Profile-Mode', self.mode)
+            if mode == SAMPLING:
+                return await self._run_sampled_async(view, args, kwargs)
+            return await self._run_deterministic_async(view, args, kwargs)
+        return profiled_view
+
+    def _run_deterministic(self, view, args, kwargs):
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(view, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            profile.create_stats()
+            self._store(DETERMINISTIC, duration, marshal.dumps(profile.stats))
+
+    def _run_sampled(self, view, args, kwargs):
+        sampler = StackSampler(threading.get_ident())
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            sampler.stop()
+            self._store(SAMPLING, time.perf_counter() - start, sampler.collapsed())
+
+    async def _run_deterministic_async(self, view, args, kwargs):
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return await _stepped(view(*args, **kwargs), profile.enable, profile.disable)
+        finally:
+            duration = time.perf_counter() - start
+            profile.create_stats()
+            self._store(DETERMINISTIC, duration, marshal.dumps(profile.stats))
+
+    async def _run_sampled_async(self, view, args, kwargs):
+        sampler = StackSampler(None)
+        loop_thread = threading.get_ident()
+
+        def resume():
+            sampler.thread_id = loop_thread
+
+        def pause():
+            sampler.thread_id = None
+
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            return await _stepped(view(*args, **kwargs), resume, pause)
+        finally:
+            sampler.stop()
+            self._store(SAMPLING, time.perf_counter() - start, sampler.collapsed())
+
+    def _store(self, mode, duration, data):
+        with self._lock:
+            self.profiles.append(ProfileRecord(next(self._ids), mode, duration, data))
+
+    def get(self, profile_id):
+        for record in list(self.profiles):
+            if record.id == profile_id:
+                return record
+        return None
+
+    def check_admin(self):
+        if not self._has_token():
+            abort(403)
+
+
+def install(app, profiler=None):
+    """Wrap every registered view of ``app`` with the profiler when enabled.
+
+    Must be called after all routes and blueprints are registered. Returns the
+    profiler, or None when profiling is disabled.
+    """
+    profiler = profiler or Profiler.from_env()
+    if not profiler.enabled:
+        return None
+
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint == 'static':
+            continue
+        if inspect.iscoroutinefunction(view):
+            # Profiled inside the coroutine, which runs on the shared loop thread
+            app.view_functions[endpoint] = app.ensure_sync(profiler.wrap_async(view))
+        else:
+            app.view_functions[endpoint] = profiler.wrap(view)
+
+    @app.route('/admin/profiles', methods=['GET'])
+    def list_profiles():
+        profiler.check_admin()
+        return jsonify([record.to_dict() for record in reversed(profiler.profiles)])
+
+    @app.route('/admin/profiles/<int:profile_id>.pstats', methods=['GET'])
+    def download_pstats(profile_id):
+        profiler.check_admin()
+        record = profiler.get(profile_id)
+        if not record or record.mode != DETERMINISTIC:
+            return jsonify({'error': 'Profile not found'}), 404
+        return Response(record.data, mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename=profile-{record.id}-{record.endpoint}.pstats'})
+
+    @app.route('/admin/profiles/<int:profile_id>.collapsed', methods=['GET'])
+    def download_collapsed(profile_id):
+        profiler.check_admin()
+        record = profiler.get(profile_id)
+        if not record or record.mode != SAMPLING:
+            return jsonify({'error': 'Profile not found'}), 404
+        return Response(record.data, mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename=profile-{record.id}-{record.endpoint}.collapsed'})
+
+    return profiler
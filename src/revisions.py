@@ -0,0 +1,86 @@
+"""Delta encoding for note revision history.
+
+A revision stores either a full snapshot of a note's versioned fields or a
+delta against the previous revision. Text fields are diffed word by word
+with difflib and only the changed runs are kept, so an autosave that
+touches a few words costs a few bytes. Other fields are stored whole, and
+only when they changed.
+
+A delta is a dict of field -> change. Text changes are lists of
+``[start, end, text]`` edits replacing tokens ``start:end`` of the previous
+version; any other change is the new value.
+"""
+import difflib
+import re
+
+# Fields captured in revisions (order and timestamps are not versioned)
+VERSIONED_FIELDS = ('title', 'content', 'tags', 'event_date', 'event_time')
+TEXT_FIELDS = ('title', 'content')
+
+# Words with their trailing whitespace; joining the tokens gives the text back
+_TOKEN = re.compile(r'\s+|\S+\s*')
+
+
+def tokenize(text):
+    return _TOKEN.findall(text or '')
+
+
+def diff_text(old, new):
+    """Edits turning ``old`` into ``new``, as [start, end, replacement] token runs"""
+    old_tokens, new_tokens = tokenize(old), tokenize(new)
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    return [[i1, i2, ''.join(new_tokens[j1:j2])]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def patch_text(old, edits):
+    tokens = tokenize(old)
+    parts, position = [], 0
+    for start, end, text in edits:
+        parts.extend(tokens[position:start])
+        parts.append(text)
+        position = end
+    parts.extend(tokens[position:])
+    return ''.join(parts)
+
+
+def make_delta(old_state, new_state):
+    """Delta turning ``old_state`` into ``new_state`` (empty when they are equal)"""
+    delta = {}
+    for field in VERSIONED_FIELDS:
+        old, new = old_state.get(field), new_state.get(field)
+        if old == new:
+            continue
+        if field in TEXT_FIELDS and old is not None and new is not None:
+            delta[field] = diff_text(old, new)
+        else:
+            delta[field] = new
+    return delta
+
+
+def apply_delta(state, delta):
+    state = dict(state)
+    for field, change in delta.items():
+        if field in TEXT_FIELDS and isinstance(change, list) and state.get(field) is not None:
+            state[field] = patch_text(state[field], change)
+        else:
+            state[field] = change
+    return state
+
+
+def rebuild(revisions, revision=None):
+    """Rebuild the state at ``revision`` (default: the newest one).
+
+    ``revisions`` are dicts with 'revision', 'kind' and decoded 'data', and
+    must include the nearest snapshot at or before the wanted revision.
+    Returns None when that snapshot is missing.
+    """
+    chain = sorted((r for r in revisions if revision is None or r['revision'] <= revision),
+                   key=lambda r: r['revision'])
+    snapshots = [i for i, r in enumerate(chain) if r['kind'] == 'snapshot']
+    if not snapshots:
+        return None
+    state = chain[snapshots[-1]]['data']
+    for entry in chain[snapshots[-1] + 1:]:
+        state = apply_delta(state, entry['data'])
+    return state
@@ -1,19 +1,233 @@
-from flask import Blueprint, jsonify, request
-from src.models.note import Note
-from src.llm import translate_text
-from src.llm import extract_structured_notes, generate_notes_from_title
+from flask import Blueprint, Response, g, jsonify, request, stream_with_context
+from src.metrics import instrument_blueprint
+from src.compression import compress_blueprint
+from src.events import broker, stream_enabled
+from src.models.note import FORMATS, Note
+from src.models.tag import NoteTag
+from src import agenda
+from src.routes.user import current_user_id, error_response
+from src.transport import BackendUnavailable, stale_reads
+from src.llm import atranslate_text, atranslate_tags
+from src.llm import aextract_structured_notes, agenerate_notes_from_title
+import asyncio
+import base64
 import json
+from datetime import datetime
 
-note_bp = Blueprint('note', __name__)
+note_bp = compress_blueprint(instrument_blueprint(Blueprint('note', __name__)))
+
+@note_bp.before_request
+def resolve_user():
+    """Scope every note request to the calling user (g.user_id)"""
+    try:
+        g.user_id = current_user_id()
+    except ValueError:
+        return jsonify({'error': 'Invalid X-User-Id header'}), 400
+
+def _notes_response(notes, stale=None):
+    """Serialize a note list in the format the client negotiated.
+
+    ``?format=json|columnar|msgpack`` takes precedence over the Accept
+    header; JSON objects are the default. ``stale`` is the StaleReads of
+    the request, marking the response when it was answered from memory.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        mimetype = request.accept_mimetypes.best_match(list(FORMATS.values()), default=FORMATS['json'])
+        fmt = next(name for name, value in FORMATS.items() if value == mimetype)
+    elif fmt not in FORMATS:
+        return jsonify({'error': f'Unsupported format, expected one of: {", ".join(FORMATS)}'}), 406
+    body, mimetype = Note.serialize(notes, fmt)
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    if stale is not None and stale.served:
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    return response
 
 @note_bp.route('/notes', methods=['GET'])
 def get_notes():
-    """Get all notes, ordered by most recently updated"""
+    """Get all notes, ordered by most recently updated.
+
+    Optional query: ?tag=a&tag=b&match=all|any keeps notes carrying all
+    (default) or any of the given tags, looked up in the tag index.
+    """
+    tags = [tag for tag in request.args.getlist('tag') if tag]
+    match = request.args.get('match', 'all')
+    if match not in ('all', 'any'):
+        return jsonify({'error': 'match must be "all" or "any"'}), 400
+    try:
+        with stale_reads() as stale:
+            if tags:
+                notes = Note.get_by_tags(tags, g.user_id, match)
+            else:
+                notes = Note.get_all(g.user_id)
+        return _notes_response(notes, stale)
+    except Exception as e:
+        return error_response(e)
+
+# Default and maximum number of notes returned by the agenda queries
+EVENTS_LIMIT = 50
+MAX_EVENTS_LIMIT = 500
+
+
+def _events_limit():
+    limit = int(request.args.get('limit', EVENTS_LIMIT))
+    if limit < 1:
+        raise ValueError(limit)
+    return min(limit, MAX_EVENTS_LIMIT)
+
+
+@note_bp.route('/notes/events', methods=['GET'])
+def get_note_events():
+    """Get notes with an event between two dates, soonest first.
+
+    Query: ?from=2024-05-01&to=2024-06-01 (ISO dates or timestamps, "to" is
+    exclusive, both optional) and ?limit=N.
+    """
+    try:
+        start = agenda.normalize(request.args['from']) if request.args.get('from') else None
+        end = agenda.normalize(request.args['to']) if request.args.get('to') else None
+        limit = _events_limit()
+    except ValueError:
+        return jsonify({'error': 'Expected ISO dates for from/to and a positive limit'}), 400
+    try:
+        return _notes_response(Note.get_events(start, end, g.user_id, limit))
+    except Exception as e:
+        return error_response(e)
+
+
+@note_bp.route('/notes/upcoming', methods=['GET'])
+def get_upcoming_notes():
+    """Get the next N notes with an event from now (or ?from=), soonest first.
+
+    Events are in wall-clock time, so "now" is taken in the client's ?tz=
+    (an IANA name such as Europe/Berlin), or the server's zone without it.
+    """
+    try:
+        if request.args.get('from'):
+            start = agenda.normalize(request.args['from'])
+        else:
+            start = agenda.now(request.args.get('tz'))
+        limit = _events_limit()
+    except ValueError:
+        return jsonify({'error': 'Expected an ISO date for from, a known tz and a positive limit'}), 400
     try:
-        notes = Note.get_all()
-        return jsonify([note.to_dict() for note in notes])
+        return _notes_response(Note.get_events(start, None, g.user_id, limit))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+@note_bp.route('/tags', methods=['GET'])
+def get_tags():
+    """Get the user's tags with note counts, most used first"""
+    try:
+        return jsonify(NoteTag.counts(g.user_id))
+    except Exception as e:
+        return error_response(e)
+
+def _encode_sync_token(horizon):
+    return base64.urlsafe_b64encode(f'txid:{horizon}'.encode()).decode().rstrip('=')
+
+
+def _decode_sync_token(token):
+    """Decode a sync token back into its transaction horizon, raising ValueError if invalid.
+
+    Tokens of older versions held a timestamp or a change sequence position;
+    they decode to None so the client gets the full list again.
+    """
+    try:
+        value = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    except Exception:
+        raise ValueError('Invalid sync token')
+    if value.startswith('txid:') and value[5:].isdigit():
+        return int(value[5:])
+    if value.isdigit():
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('Invalid sync token')
+    return None
+
+
+@note_bp.route('/notes/changes', methods=['GET'])
+def get_note_changes():
+    """Get notes changed since a sync token.
+
+    Query: ?since=<sync_token>. Returns notes created or updated after the
+    token, ids of notes deleted after it and a new token for the next call.
+    Without a token the full list is returned with "full": true.
+
+    Tokens hold the oldest transaction still running when the call started.
+    Writes of transactions from that one on are returned again by the next
+    call even if this one already had them, because a transaction that began
+    earlier can commit later. Clients apply changes by id, so a repeat is
+    harmless.
+    """
+    token = request.args.get('since')
+    try:
+        since = None
+        if token:
+            try:
+                since = _decode_sync_token(token)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        full = since is None
+        # Taken before reading, so nothing committed after the read is below it
+        horizon = Note.sync_horizon()
+        if full:
+            notes, tombstones = Note.get_all(g.user_id), []
+        else:
+            notes, tombstones = Note.get_changes(since, g.user_id)
+
+        return jsonify({
+            'notes': [note.to_dict() for note in notes],
+            'deleted': [tombstone['note_id'] for tombstone in tombstones],
+            'sync_token': _encode_sync_token(horizon),
+            'full': full
+        })
+    except Exception as e:
+        return error_response(e)
+
+# Seconds between keep-alive comments on idle event streams
+STREAM_HEARTBEAT = 15
+
+
+@note_bp.route('/notes/stream', methods=['GET'])
+def stream_notes():
+    """Push note changes to the client as Server-Sent Events.
+
+    Events: "upsert" (full note), "delete" ({id}), "reorder" ({order: [[id, order], ...]})
+    and "resync" when the client fell behind and should call /notes/changes.
+    Reconnecting clients send Last-Event-ID to replay what they missed.
+    Answers 503 when streaming is disabled (see events.stream_enabled).
+    """
+    if not stream_enabled():
+        return jsonify({'error': 'Event stream disabled, poll /api/notes/changes instead'}), 503
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    subscription = broker.subscribe(last_event_id, user_id=g.user_id)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = subscription.get(timeout=STREAM_HEARTBEAT)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                elif event == 'resync':
+                    yield 'event: resync\ndata: {}\n\n'
+                else:
+                    yield f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n'
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @note_bp.route('/notes', methods=['POST'])
 def create_note():
@@ -23,13 +237,12 @@ def create_note():
         if not data or 'title' not in data or 'content' not in data:
             return jsonify({'error': 'Title and content are required'}), 400
         
-        # Get max order for new note positioning
-        max_order = Note.get_max_order()
-        
         note = Note(
+            user_id=g.user_id,
             title=data['title'],
             content=data['content'],
-            order=max_order + 1,
+            # New notes go first in the user's list
+            order=Note.next_order(g.user_id),
             tags=data.get('tags'),
             event_date=data.get('event_date'),
             event_time=data.get('event_time')
@@ -41,21 +254,50 @@ def create_note():
         else:
             return jsonify({'error': 'Failed to create note'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @note_bp.route('/notes/<int:note_id>', methods=['GET'])
 def get_note(note_id):
     """Get a specific note by ID"""
-    note = Note.get_by_id(note_id)
+    note = Note.get_by_id(note_id, g.user_id)
     if not note:
         return jsonify({'error': 'Note not found'}), 404
     return jsonify(note.to_dict())
 
+@note_bp.route('/notes/<int:note_id>/revisions', methods=['GET'])
+def get_note_revisions(note_id):
+    """List a note's revisions, newest first.
+
+    Entries only carry metadata; GET /notes/<id>/revisions/<revision> returns
+    the note's title, content, tags and event fields as of that revision.
+    """
+    try:
+        note = Note.get_by_id(note_id, g.user_id)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        return jsonify([revision.to_dict() for revision in note.get_revisions()])
+    except Exception as e:
+        return error_response(e)
+
+@note_bp.route('/notes/<int:note_id>/revisions/<int:revision>', methods=['GET'])
+def get_note_revision(note_id, revision):
+    """Get a note as of one revision, rebuilt from the nearest snapshot"""
+    try:
+        note = Note.get_by_id(note_id, g.user_id)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        state = note.get_revision(revision)
+        if state is None:
+            return jsonify({'error': 'Revision not found'}), 404
+        return jsonify(dict(state, id=note_id, revision=revision))
+    except Exception as e:
+        return error_response(e)
+
 @note_bp.route('/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     """Update a specific note"""
     try:
-        note = Note.get_by_id(note_id)
+        note = Note.get_by_id(note_id, g.user_id)
         if not note:
             return jsonify({'error': 'Note not found'}), 404
         
@@ -63,14 +305,7 @@ def update_note(note_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        note.title = data.get('title', note.title)
-        note.content = data.get('content', note.content)
-        tags = data.get('tags')
-        if tags is not None:
-            note.tags = tags
-        # event date/time
-        note.event_date = data.get('event_date', note.event_date)
-        note.event_time = data.get('event_time', note.event_time)
+        _apply_note_fields(note, data)
         
         saved_note = note.save()
         if saved_note:
@@ -78,8 +313,215 @@ def update_note(note_id):
         else:
             return jsonify({'error': 'Failed to update note'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+
+def _apply_note_fields(note, data):
+    """Copy the editable fields present in ``data`` onto ``note``"""
+    note.title = data.get('title', note.title)
+    note.content = data.get('content', note.content)
+    tags = data.get('tags')
+    if tags is not None:
+        note.tags = tags
+    # event date/time
+    note.event_date = data.get('event_date', note.event_date)
+    note.event_time = data.get('event_time', note.event_time)
+
+
+# Upper bound on operations accepted by one /batch request
+MAX_BATCH_OPERATIONS = 500
+
+
+@note_bp.route('/batch', methods=['POST'])
+def batch_notes():
+    """Apply an ordered list of note operations with grouped writes.
+
+    Expected JSON body: { "operations": [
+        {"op": "create", "ref": "tmp-1", "note": {"title": ..., "content": ...}},
+        {"op": "update", "id": 3, "note": {...}},         (replaces all fields)
+        {"op": "patch", "id": "tmp-1", "note": {...}},    (changes given fields)
+        {"op": "delete", "id": 4},
+        {"op": "reorder", "order": [id1, id2, ...]}
+    ] }
+    Referenced notes are fetched in one query and the operations applied to
+    them in memory, then written with at most one insert, one update (of the
+    changed fields only) and one delete, in that order. A create's "ref" (a
+    string or number) can stand in for its id in later operations, as is or
+    as {"ref": ...}; notes created and deleted in the same batch are never
+    written.
+    Returns { "results": [...] } with a status (and note) per operation. If a
+    write fails, operations that depended on it or a later one get its error
+    status instead, and the response carries that status with the results.
+    """
+    data = request.json
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return jsonify({'error': 'Invalid payload, expected {"operations": [...]}'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+
+    try:
+        results, error = _run_batch(operations, g.user_id)
+        if error is None:
+            return jsonify({'results': results}), 200
+        return error_response(error, results=results)
+    except Exception as e:
+        return error_response(e)
+
+
+# Writes of a batch, in the order they are made
+BATCH_WRITES = ('insert', 'update', 'delete')
+
+
+def _batch_key(value):
+    """Note id or create ref named by ``value``, raising ValueError unless it is a string, number or {"ref": ...}"""
+    if isinstance(value, dict) and list(value) == ['ref']:
+        value = value['ref']
+    if isinstance(value, (int, str)) and not isinstance(value, bool):
+        return value
+    raise ValueError(f'Invalid note reference {value!r}')
+
+
+def _run_batch(operations, user_id):
+    """Apply ``operations``, returning (results, error of the first failed write or None)"""
+    ids = set()
+    for operation in operations:
+        if not isinstance(operation, dict):
+            continue
+        if isinstance(operation.get('id'), int):
+            ids.add(operation['id'])
+        if operation.get('op') == 'reorder' and isinstance(operation.get('order'), list):
+            ids.update(note_id for note_id in operation['order'] if isinstance(note_id, int))
+    notes = Note.get_many(ids, user_id)
+
+    created = {}    # ref -> note awaiting insert
+    new_notes = []
+    dirty = {}      # id -> existing note to write back
+    deleted = set()
+    results = []
+    writes = []     # per operation, the BATCH_WRITES it depends on
+
+    def lookup(key):
+        if key in created:
+            return created[key]
+        if isinstance(key, int) and key not in deleted:
+            return notes.get(key)
+        return None
+
+    for operation in operations:
+        writes.append(set())
+        op = operation.get('op') if isinstance(operation, dict) else None
+        fields = operation.get('note') if isinstance(operation, dict) else None
+        if op == 'create':
+            if not isinstance(fields, dict) or 'title' not in fields or 'content' not in fields:
+                results.append({'status': 400, 'error': 'Title and content are required'})
+                continue
+            ref = operation.get('ref')
+            if ref is not None and (not isinstance(ref, (int, str)) or isinstance(ref, bool)):
+                results.append({'status': 400, 'error': f'Invalid ref {ref!r}'})
+                continue
+            note = Note(user_id=user_id, title=fields['title'], content=fields['content'],
+                        tags=fields.get('tags'), event_date=fields.get('event_date'),
+                        event_time=fields.get('event_time'))
+            new_notes.append(note)
+            if ref is not None:
+                created[ref] = note
+            writes[-1].add('insert')
+            results.append({'status': 201, 'note': note})
+        elif op in ('update', 'patch'):
+            if not isinstance(fields, dict) or (op == 'update' and ('title' not in fields or 'content' not in fields)):
+                results.append({'status': 400, 'error': 'No data provided' if op == 'patch' else 'Title and content are required'})
+                continue
+            try:
+                note = lookup(_batch_key(operation.get('id')))
+            except ValueError as e:
+                results.append({'status': 400, 'error': str(e)})
+                continue
+            if note is None:
+                results.append({'status': 404, 'error': 'Note not found'})
+                continue
+            if op == 'update':
+                note.tags = note.event_date = note.event_time = None
+            _apply_note_fields(note, fields)
+            if note.id:
+                dirty[note.id] = note
+            writes[-1].add('update' if note.id else 'insert')
+            results.append({'status': 200, 'note': note})
+        elif op == 'delete':
+            try:
+                note = lookup(_batch_key(operation.get('id')))
+            except ValueError as e:
+                results.append({'status': 400, 'error': str(e)})
+                continue
+            if note is None:
+                results.append({'status': 404, 'error': 'Note not found'})
+                continue
+            if note.id:
+                deleted.add(note.id)
+                dirty.pop(note.id, None)
+                writes[-1].add('delete')
+            else:
+                new_notes.remove(note)
+                created = {ref: n for ref, n in created.items() if n is not note}
+            results.append({'status': 204})
+        elif op == 'reorder':
+            order = operation.get('order')
+            if not isinstance(order, list):
+                results.append({'status': 400, 'error': 'Expected "order": [ids...]'})
+                continue
+            try:
+                order = [_batch_key(key) for key in order]
+            except ValueError as e:
+                results.append({'status': 400, 'error': str(e)})
+                continue
+            # Same numbering as /notes/reorder: the first id gets the highest order
+            for idx, key in enumerate(order):
+                note = lookup(key)
+                if note is not None:
+                    note.order = len(order) - idx
+                    if note.id:
+                        dirty[note.id] = note
+                    writes[-1].add('update' if note.id else 'insert')
+            results.append({'status': 200})
+        else:
+            results.append({'status': 400, 'error': f'Unknown operation {op!r}'})
+
+    def insert():
+        if new_notes:
+            # Reserve one order value per new note, later creates go first
+            top = Note.next_order(user_id, len(new_notes))
+            for offset, note in enumerate(new_notes):
+                if not note.order:
+                    note.order = top - len(new_notes) + 1 + offset
+        Note.insert_many(new_notes)
+
+    missing = set()
+
+    def update():
+        # Notes deleted by another request since they were read are not written back
+        written = Note.update_many(list(dirty.values()))
+        missing.update(set(dirty) - {note.id for note in written})
 
+    # Each write is one statement; after a failure the later ones are not attempted
+    error, failed = None, set()
+    for write, run in zip(BATCH_WRITES, (insert, update, lambda: Note.delete_many(deleted, user_id))):
+        if error is None:
+            try:
+                run()
+            except Exception as e:
+                error = e
+        if error is not None:
+            failed.add(write)
+
+    for index, result in enumerate(results):
+        if writes[index] & failed:
+            status = 503 if isinstance(error, BackendUnavailable) else 500
+            results[index] = {'status': status, 'error': str(error)}
+        elif 'note' in result and result['note'].id in missing:
+            results[index] = {'status': 404, 'error': 'Note not found'}
+        elif 'note' in result:
+            result['note'] = result['note'].to_dict()
+    return results, error
 
 @note_bp.route('/notes/reorder', methods=['POST'])
 def reorder_notes():
@@ -106,20 +548,20 @@ def reorder_notes():
             id_order_pairs.append((note_id, order_value))
         
         # Bulk update orders
-        Note.update_orders(id_order_pairs)
+        Note.update_orders(id_order_pairs, g.user_id)
         return jsonify({'success': True}), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 
 @note_bp.route('/notes/<int:note_id>/translate', methods=['POST'])
-def translate_note(note_id):
+async def translate_note(note_id):
     """Translate a specific note's content using LLM helper.
 
     Expected JSON body: { "target_language": "French" }
     Returns the translated content but does not overwrite the original content.
     """
-    note = Note.get_by_id(note_id)
+    note = await Note.aget_by_id(note_id, g.user_id)
     if not note:
         return jsonify({'error': 'Note not found'}), 404
     
@@ -127,18 +569,16 @@ def translate_note(note_id):
     target = data.get('target_language', 'French')
     try:
         # Check if content is already in target language
-        if not _needs_translation(note.title or '', note.content or '', note.tags or '', target):
+        if not await _needs_translation(note.title or '', note.content or '', note.tags or '', target):
             return jsonify({'no_translation_needed': True}), 200
             
-        translated_title = translate_text(note.title or '', target_language=target)
-        translated_content = translate_text(note.content or '', target_language=target)
-        
-        # Translate tags if they exist, extracting only literal words from stored format
-        translated_tags = ''
-        if note.tags:
-            from src.llm import translate_tags
-            # translate_tags will accept list or JSON/string and return cleaned CSV
-            translated_tags = translate_tags(note.tags, target_language=target)
+        # Title, content and tags are independent, translate them concurrently.
+        # translate_tags accepts list or JSON/string and returns cleaned CSV
+        translated_title, translated_content, translated_tags = await asyncio.gather(
+            atranslate_text(note.title or '', target_language=target),
+            atranslate_text(note.content or '', target_language=target),
+            atranslate_tags(note.tags, target_language=target),
+        )
         
         return jsonify({
             'translated_title': translated_title, 
@@ -146,12 +586,12 @@ def translate_note(note_id):
             'translated_tags': translated_tags
         }), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 
-def _needs_translation(title, content, tags, target_language):
+async def _needs_translation(title, content, tags, target_language):
     """Check if the content needs translation by detecting if it's already in the target language"""
-    from src.llm import detect_language
+    from src.llm import adetect_language
     # Normalize tags into plain text (handle JSON string or list)
     tags_text = ''
     if tags:
@@ -180,7 +620,7 @@ def _needs_translation(title, content, tags, target_language):
         return False
     
     try:
-        detected_language = detect_language(combined_text)
+        detected_language = await adetect_language(combined_text)
         # Simple check - if detected language matches target, no translation needed
         return not (detected_language.lower() == target_language.lower())
     except:
@@ -189,30 +629,30 @@ def _needs_translation(title, content, tags, target_language):
 
 
 @note_bp.route('/notes/<int:note_id>/generate-tags', methods=['POST'])
-def generate_tags(note_id):
+async def generate_tags(note_id):
     """Generate tags for a note using LLM and persist them.
 
     Optional JSON body: { "lang": "English" }
     """
-    note = Note.get_by_id(note_id)
+    note = await Note.aget_by_id(note_id, g.user_id)
     if not note:
         return jsonify({'error': 'Note not found'}), 404
     
     data = request.json or {}
     lang = data.get('lang', 'English')
     try:
-        structured = extract_structured_notes(note.content or note.title or '', lang=lang)
+        structured = await aextract_structured_notes(note.content or note.title or '', lang=lang)
         tags = structured.get('Tags') or structured.get('tags') or []
         if tags:
             note.tags = tags
-            note.save()
+            await asyncio.to_thread(note.save)
         return jsonify({'tags': tags}), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 
 @note_bp.route('/notes/generate', methods=['POST'])
-def generate_note():
+async def generate_note():
     """Generate a structured note from free-text using LLM and save it.
 
     Expected JSON body: { "text": "...", "lang": "English" }
@@ -224,44 +664,44 @@ def generate_note():
         lang = data.get('lang', 'English')
         if title:
             # Generate content from a short title
-            content = generate_notes_from_title(title, lang=lang)
+            content = await agenerate_notes_from_title(title, lang=lang)
         else:
             text = data.get('text', '').strip()
             if not text:
                 return jsonify({'error': 'No title or text provided'}), 400
-            structured = extract_structured_notes(text, lang=lang)
+            structured = await aextract_structured_notes(text, lang=lang)
             # structured expected to contain Title and Notes
             title = structured.get('Title') or (text[:50] + '...')
             content = structured.get('Notes') or text
 
-        # Determine highest current order and set the new note to appear first
-        max_order = Note.get_max_order()
-        note = Note(title=title, content=content, order=max_order + 1)
-        saved_note = note.save()
+        # Reserve the next order value so the new note appears first
+        order = await asyncio.to_thread(Note.next_order, g.user_id)
+        note = Note(user_id=g.user_id, title=title, content=content, order=order)
+        saved_note = await asyncio.to_thread(note.save)
         
         if not saved_note:
             return jsonify({'error': 'Failed to create note'}), 500
 
         # Attempt to generate tags using extract_structured_notes on the generated content
         try:
-            structured = extract_structured_notes(content, lang=lang)
+            structured = await aextract_structured_notes(content, lang=lang)
             tags = structured.get('Tags') or structured.get('tags') or []
             if tags:
                 saved_note.tags = tags
-                saved_note.save()
+                await asyncio.to_thread(saved_note.save)
         except Exception:
             # ignore tag generation errors
             pass
 
         return jsonify(saved_note.to_dict()), 201
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @note_bp.route('/notes/<int:note_id>', methods=['DELETE'])
 def delete_note(note_id):
     """Delete a specific note"""
     try:
-        note = Note.get_by_id(note_id)
+        note = Note.get_by_id(note_id, g.user_id)
         if not note:
             return jsonify({'error': 'Note not found'}), 404
         
@@ -271,18 +711,42 @@ def delete_note(note_id):
         else:
             return jsonify({'error': 'Failed to delete note'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+# Default and maximum number of notes returned by semantic search
+SEMANTIC_LIMIT = 20
+MAX_SEMANTIC_LIMIT = 100
+
 
 @note_bp.route('/notes/search', methods=['GET'])
 def search_notes():
-    """Search notes by title or content"""
+    """Search notes by title or content.
+
+    ?mode=semantic ranks notes by similarity to the query instead of
+    matching substrings (see src/semantic.py) and returns the best ?limit=N.
+    Without a vector index (NOTES_SEMANTIC_INDEX unset, or still building)
+    it answers with a text search; the X-Search-Mode header says which one ran.
+    """
     query = request.args.get('q', '')
+    mode = request.args.get('mode', 'text')
+    if mode not in ('text', 'semantic'):
+        return jsonify({'error': 'mode must be "text" or "semantic"'}), 400
+    try:
+        limit = min(int(request.args.get('limit', SEMANTIC_LIMIT)), MAX_SEMANTIC_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
     if not query:
         return jsonify([])
     
     try:
-        notes = Note.search(query)
-        return jsonify([note.to_dict() for note in notes])
+        with stale_reads() as stale:
+            notes = Note.semantic_search(query, g.user_id, limit) if mode == 'semantic' else None
+            if notes is None:
+                mode, notes = 'text', Note.search(query, g.user_id)
+        response = _notes_response(notes, stale)
+        if isinstance(response, Response):
+            response.headers['X-Search-Mode'] = mode
+        return response
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
@@ -1,7 +1,37 @@
 from flask import Blueprint, jsonify, request
+from src.metrics import instrument_blueprint
 from src.models.user import User
+from src.transport import BackendUnavailable
+import math
 
-user_bp = Blueprint('user', __name__)
+user_bp = instrument_blueprint(Blueprint('user', __name__))
+
+def current_user_id():
+    """Id of the requesting user from the X-User-Id header, or None when anonymous.
+
+    ``?user_id=`` is accepted too because EventSource cannot set headers.
+    Raises ValueError for a malformed id.
+    """
+    value = request.headers.get('X-User-Id') or request.args.get('user_id')
+    if not value:
+        return None
+    user_id = int(value)
+    if user_id <= 0:
+        raise ValueError(value)
+    return user_id
+
+def error_response(e, **extra):
+    """Error response for an exception raised by a route: 503 while Supabase is unavailable, else 500.
+
+    Keyword arguments are added to the JSON body.
+    """
+    if isinstance(e, BackendUnavailable):
+        response = jsonify({'error': str(e), **extra})
+        response.status_code = 503
+        if e.retry_after:
+            response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response
+    return jsonify({'error': str(e), **extra}), 500
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
@@ -9,7 +39,7 @@ def get_users():
         users = User.get_all()
         return jsonify([user.to_dict() for user in users])
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
@@ -25,7 +55,7 @@ def create_user():
         else:
             return jsonify({'error': 'Failed to create user'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -35,7 +65,7 @@ def get_user(user_id):
             return jsonify({'error': 'User not found'}), 404
         return jsonify(user.to_dict())
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
@@ -57,7 +87,7 @@ def update_user(user_id):
         else:
             return jsonify({'error': 'Failed to update user'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
@@ -72,4 +102,4 @@ def delete_user(user_id):
         else:
             return jsonify({'error': 'Failed to delete user'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
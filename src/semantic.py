@@ -0,0 +1,363 @@
+"""Offline semantic search over notes.
+
+``embed`` turns text into a dense vector on the CPU, without a model to
+download: words, word pairs and character trigrams are hashed into
+``DIMENSIONS`` signed buckets (the hashing trick) and the sum is
+L2-normalized, so a dot product is the cosine similarity. Matching is fuzzy
+rather than literal: other forms of a word, typos and partial words still
+score, and a note's tags (including LLM generated ones) bring topic words
+into its vector.
+
+``VectorIndex`` keeps one row per note in a contiguous float32 matrix, so a
+query is one matrix-vector product and an argpartition for the top k.
+Saves and deletes update single rows in place; searches run concurrently
+with each other but not with writes.
+
+With ``NOTES_SEMANTIC_INDEX=memory`` the module-level ``index`` is created
+at startup and filled from the notes table by a background thread, while
+saves and deletes already go to it; until it is ``ready`` (and when it is
+not enabled) semantic searches fall back to text search. With
+``VECTOR_INDEX_PATH`` also set it is memory-mapped from ``.npy`` files next
+to that path and only notes whose ``updated_at`` changed since it was
+written are embedded again; without it every start embeds every note. Like
+the event index it only sees the writes of this process, so use it for
+single process deployments.
+"""
+import atexit
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+DIMENSIONS = 128
+INITIAL_CAPACITY = 1024
+
+# Weights of the hashed features
+WORD_WEIGHT = 1.0
+PAIR_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.25
+
+# Too common to say anything about a note
+STOPWORDS = frozenset('''
+a an and are as at be but by for from has have i if in into is it its me my
+no not of on or our so that the their then there this to was we were what
+when which will with you your
+'''.split())
+
+_WORD = re.compile(r'\w+')
+
+# Columns of the per-row metadata
+NOTE, USER, STAMP = 0, 1, 2
+# User id stored for shared (user_id NULL) notes; empty rows have note id 0
+SHARED = -1
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def features(text):
+    """Hashed (bucket index, signed weight) arrays of the n-grams of ``text``"""
+    words = [word for word in _WORD.findall((text or '').lower()) if word not in STOPWORDS]
+    grams, weights = [], []
+    for position, word in enumerate(words):
+        grams.append('w ' + word)
+        weights.append(WORD_WEIGHT)
+        if position:
+            grams.append('p ' + words[position - 1] + ' ' + word)
+            weights.append(PAIR_WEIGHT)
+        padded = f'<{word}>'
+        for start in range(len(padded) - 2):
+            grams.append(padded[start:start + 3])
+            weights.append(TRIGRAM_WEIGHT)
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint32, count=len(grams))
+    # The top bit picks the sign so that collisions cancel out on average
+    signs = np.where(hashes >> 31, -1.0, 1.0)
+    return hashes % DIMENSIONS, signs * np.asarray(weights)
+
+
+def embed(text):
+    """Unit-length float32 vector of ``text`` (all zeros for text without words)"""
+    buckets, weights = features(text)
+    vector = np.bincount(buckets, weights=weights, minlength=DIMENSIONS).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Note fields that make up the embedded text
+FIELDS = ('title', 'content', 'tags')
+
+
+def note_text(note):
+    return '\n'.join([note.title or '', note.content or '', ' '.join(note.tags)])
+
+
+def stamp(updated_at):
+    """``updated_at`` as integer microseconds, the freshness check of persisted rows"""
+    if not updated_at:
+        return 0
+    value = datetime.fromisoformat(updated_at)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+class ReadWriteLock:
+    """Any number of readers or one writer; waiting writers go before new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class VectorIndex:
+    """Note vectors in a contiguous matrix, with (note id, user id, stamp) per row.
+
+    Rows ``0..count-1`` are in use; deleting a note moves the last row into
+    its place so the matrix never has holes.
+    """
+
+    def __init__(self, path=None, capacity=INITIAL_CAPACITY):
+        self.path = path
+        self.rows = {}   # note id -> row
+        self.count = 0
+        self._lock = ReadWriteLock()
+        # Set once sync() has filled the index
+        self.ready = threading.Event()
+        # Notes deleted while sync() runs, which it must not add back
+        self.removed = set()
+        self.vectors, self.meta = self._load() if path else (None, None)
+        if self.vectors is None:
+            self._install(*self._allocate(capacity))
+
+    def __len__(self):
+        return self.count
+
+    # -- storage -----------------------------------------------------------
+
+    def _files(self):
+        return self.path + '.vectors.npy', self.path + '.meta.npy'
+
+    def _load(self):
+        vectors_path, meta_path = self._files()
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return None, None
+        try:
+            vectors = np.load(vectors_path, mmap_mode='r+')
+            meta = np.load(meta_path, mmap_mode='r+')
+        except ValueError as e:
+            print(f"✗ Unreadable vector index at {self.path}, rebuilding: {e}")
+            return None, None
+        if (vectors.dtype != np.float32 or vectors.ndim != 2 or vectors.shape[1] != DIMENSIONS
+                or meta.dtype != np.int64 or meta.shape != (len(vectors), 3)):
+            print(f"✗ Vector index at {self.path} does not match this version, rebuilding")
+            return None, None
+        count = int(np.count_nonzero(meta[:, NOTE]))
+        rows = {int(note_id): row for row, note_id in enumerate(meta[:count, NOTE])}
+        if len(rows) != count or not meta[:count, NOTE].all():
+            # Interrupted while moving a row
+            print(f"✗ Vector index at {self.path} is inconsistent, rebuilding")
+            return None, None
+        self.count, self.rows = count, rows
+        return vectors, meta
+
+    def _allocate(self, capacity):
+        """Empty arrays for ``capacity`` rows, mapped to temporary files when persistent"""
+        shapes = (((capacity, DIMENSIONS), np.float32), ((capacity, 3), np.int64))
+        if not self.path:
+            return tuple(np.zeros(shape, dtype) for shape, dtype in shapes)
+        return tuple(np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=dtype, shape=shape)
+                     for (shape, dtype), path in zip(shapes, self._files()))
+
+    def _install(self, vectors, meta):
+        """Switch to newly allocated arrays, moving their files into place"""
+        if self.path:
+            # Renamed only once complete, so a crash never leaves a half-grown file
+            for array, path in zip((vectors, meta), self._files()):
+                array.flush()
+                os.replace(path + '.tmp', path)
+        self.vectors, self.meta = vectors, meta
+
+    def _grow(self):
+        vectors, meta = self._allocate(len(self.vectors) * 2)
+        vectors[:self.count] = self.vectors[:self.count]
+        meta[:self.count] = self.meta[:self.count]
+        self._install(vectors, meta)
+
+    def flush(self):
+        """Write dirty pages of a memory-mapped index to disk"""
+        with self._lock.write():
+            if isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+                self.meta.flush()
+
+    # -- writes ------------------------------------------------------------
+
+    def update(self, note_id, user_id, vector, stamp=0):
+        """Store a note's vector, unless the note was removed or the row has a newer stamp"""
+        with self._lock.write():
+            row = self.rows.get(note_id)
+            if note_id in self.removed or row is not None and self.meta[row, STAMP] > stamp:
+                return
+            if row is None:
+                if self.count == len(self.vectors):
+                    self._grow()
+                row = self.rows[note_id] = self.count
+                self.count += 1
+            self.vectors[row] = vector
+            # Metadata last: a row is only trusted once its stamp is written
+            self.meta[row] = (note_id, SHARED if user_id is None else user_id, stamp)
+
+    def update_note(self, note, changed=True):
+        """Embed a saved note, or only refresh its stamp when its text is unchanged"""
+        with self._lock.write():
+            row = self.rows.get(note.id)
+            if not changed and row is not None:
+                self.meta[row, STAMP] = max(self.meta[row, STAMP], stamp(note.updated_at))
+                return
+        self.update(note.id, note.user_id, embed(note_text(note)), stamp(note.updated_at))
+
+    def remove(self, note_id):
+        with self._lock.write():
+            if not self.ready.is_set():
+                self.removed.add(note_id)
+            row = self.rows.pop(note_id, None)
+            if row is None:
+                return
+            last = self.count - 1
+            if row != last:
+                self.vectors[row] = self.vectors[last]
+                self.meta[row] = self.meta[last]
+                self.rows[int(self.meta[row, NOTE])] = row
+            self.meta[last] = 0
+            self.count = last
+
+    # -- reads -------------------------------------------------------------
+
+    def stamps(self):
+        """note id -> stamp of every indexed note"""
+        with self._lock.read():
+            return dict(zip(self.meta[:self.count, NOTE].tolist(), self.meta[:self.count, STAMP].tolist()))
+
+    def search(self, vector, user_id=None, limit=20):
+        """(note id, similarity) of a user's notes closest to ``vector``, best first"""
+        # Writes wait for running searches, so rows cannot move during the product
+        with self._lock.read():
+            count = self.count
+            if not count or limit < 1:
+                return []
+            scores = self.vectors[:count] @ vector
+            scores[self.meta[:count, USER] != (SHARED if user_id is None else user_id)] = -np.inf
+            k = min(limit, count)
+            top = np.argpartition(scores, count - k)[count - k:]
+            top = top[np.argsort(scores[top])[::-1]]
+            note_ids = self.meta[top, NOTE].tolist()
+        return [(note_id, float(score)) for note_id, score in zip(note_ids, scores[top]) if score > 0]
+
+
+def sync(vector_index, chunk_size=500):
+    """Bring ``vector_index`` up to date with the notes table.
+
+    Only notes that are new or whose updated_at differs from the stored
+    stamp are read in full and embedded; rows of deleted notes are dropped.
+    Returns the number of notes embedded.
+    """
+    from src.models.note import Note
+    stamps = vector_index.stamps()
+    # An empty index needs every body anyway, so read them in the same pass
+    columns = 'id,user_id,updated_at' if stamps else '*'
+    seen, stale, embedded = set(), [], 0
+    for row in Note.get_rows(columns):
+        seen.add(row['id'])
+        if stamps.get(row['id']) == stamp(row['updated_at']):
+            continue
+        if stamps:
+            stale.append(row['id'])
+        else:
+            vector_index.update_note(Note(**row))
+            embedded += 1
+    for note_id in set(stamps) - seen:
+        vector_index.remove(note_id)
+    for start in range(0, len(stale), chunk_size):
+        for row in Note.get_rows('*', ids=stale[start:start + chunk_size]):
+            vector_index.update_note(Note(**row))
+            embedded += 1
+    vector_index.flush()
+    return embedded
+
+
+# Seconds between attempts to build the index when reading the notes fails
+BUILD_RETRY = 30
+
+# Created by configure_from_env() when enabled and filled in the background
+index = None
+
+
+def build(vector_index):
+    """Fill ``vector_index`` from the notes table, retrying until it succeeds, then mark it ready"""
+    while True:
+        try:
+            embedded = sync(vector_index)
+            break
+        except Exception as e:
+            print(f"✗ Failed to build the vector index, retrying in {BUILD_RETRY}s: {e}")
+            time.sleep(BUILD_RETRY)
+    with vector_index._lock.write():
+        vector_index.ready.set()
+        vector_index.removed.clear()
+    print(f"✓ Vector index ready ({len(vector_index)} notes, {embedded} embedded)")
+
+
+def configure_from_env():
+    """Create the vector index when NOTES_SEMANTIC_INDEX=memory and build it in the background.
+
+    It is memory-mapped from VECTOR_INDEX_PATH when that is set.
+    """
+    global index
+    if os.environ.get('NOTES_SEMANTIC_INDEX', '').lower() != 'memory':
+        return None
+    path = os.environ.get('VECTOR_INDEX_PATH') or None
+    try:
+        vector_index = VectorIndex(path)
+    except Exception as e:
+        print(f"✗ Failed to open vector index at {path}, building one in memory: {e}")
+        vector_index = VectorIndex()
+    index = vector_index
+    if vector_index.path:
+        atexit.register(vector_index.flush)
+    threading.Thread(target=build, args=(vector_index,), name='semantic-index-build', daemon=True).start()
+    return index
@@ -0,0 +1,432 @@
+"""Resilient HTTP transport under the Supabase (PostgREST) clients.
+
+``install`` gives a PostgREST client a new httpx session whose transport
+
+- keeps a sized pool of keep-alive connections (HTTP/2 when the optional
+  ``h2`` package is installed and the URL is https),
+- applies connect/read/write/pool timeouts to every call,
+- retries idempotent reads (GET/HEAD) on timeouts, connection errors and
+  502/503/504 answers with jittered exponential backoff, and retries any
+  request whose connection could not be opened (it was never sent),
+- counts consecutive failures in a circuit breaker: once it opens, calls
+  fail fast with ``BackendUnavailable`` for ``SUPABASE_BREAKER_RESET``
+  seconds, after which a single probe call decides whether it closes again,
+- inside ``stale_reads()`` (used by the read-only list and search routes)
+  remembers successful reads, so that while the breaker is open or a read
+  keeps failing the last answer to the same request is served instead of
+  an error; writes drop the remembered reads of the tables they touch.
+
+The routes answer ``BackendUnavailable`` with 503 and a Retry-After header,
+and stale answers carry a ``Warning: 110`` header.
+"""
+import asyncio
+import contextvars
+import importlib.util
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import httpx
+
+from src.metrics import registry
+
+POOL_SIZE = 20
+KEEPALIVE_EXPIRY = 30.0
+TIMEOUT = 10.0
+CONNECT_TIMEOUT = 3.0
+RETRIES = 2
+BACKOFF = 0.1       # seconds before the first retry, doubled for each further one
+MAX_BACKOFF = 2.0
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30.0
+STALE_CACHE_SIZE = 512
+STALE_CACHE_BYTES = 32 * 1024 * 1024
+STALE_MAX_AGE = 300.0
+
+IDEMPOTENT = frozenset({'GET', 'HEAD'})
+RETRY_STATUSES = frozenset({502, 503, 504})
+# Raised before the request left this process, so retrying is safe for any method
+NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+# Tables whose rows change along with writes to a table (cascades, views)
+DEPENDENT_TABLES = {
+    'notes': ('note_tags', 'tag_counts', 'note_revisions'),
+    'note_tags': ('tag_counts',),
+}
+
+
+class StaleReads:
+    """Opt-in of the current request to stale answers; ``served`` tells whether one was used"""
+
+    def __init__(self):
+        self.served = False
+
+
+_stale_reads = contextvars.ContextVar('stale_reads', default=None)
+
+
+@contextmanager
+def stale_reads():
+    """Let reads made inside the block be remembered and, on failure, answered from memory.
+
+    Only for routes whose answer may be out of date while Supabase is down;
+    yields a StaleReads whose ``served`` is set once a stale answer was used.
+    """
+    scope = StaleReads()
+    token = _stale_reads.set(scope)
+    try:
+        yield scope
+    finally:
+        _stale_reads.reset(token)
+
+
+def _table(request):
+    """Table (or "rpc") a PostgREST request goes to"""
+    parts = request.url.path.rstrip('/').split('/')
+    return 'rpc' if len(parts) > 1 and parts[-2] == 'rpc' else parts[-1]
+
+
+class BackendUnavailable(Exception):
+    """Supabase cannot be reached (or the breaker is open) and nothing cached can stand in"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    # Exported as the index of the state
+    STATES = (CLOSED, HALF_OPEN, OPEN)
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0    # consecutive
+        self.opened = 0      # times the breaker opened
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out; in half-open state only one probe at a time"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state, self._probing = self.HALF_OPEN, False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_after(self):
+        """Seconds until the breaker lets a probe through"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def success(self):
+        with self._lock:
+            self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def release(self):
+        """End a call that neither succeeded nor failed (e.g. it raised), freeing the probe slot"""
+        with self._lock:
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state, self._opened_at, self._probing = self.OPEN, time.monotonic(), False
+
+
+class StaleCache:
+    """Last successful answer per read request, bounded by count, bytes and age"""
+
+    def __init__(self, max_entries=STALE_CACHE_SIZE, max_bytes=STALE_CACHE_BYTES, max_age=STALE_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.size = 0
+        self._entries = OrderedDict()   # key -> (status, headers, body, stored at, table)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(request):
+        headers = request.headers
+        return (request.method, str(request.url), headers.get('accept'), headers.get('prefer'),
+                headers.get('range'), headers.get('authorization'))
+
+    def put(self, request, response, body):
+        if len(body) > self.max_bytes:
+            return
+        key = self._key(request)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[2])
+            self._entries[key] = (response.status_code, response.headers.raw, body, time.monotonic(), _table(request))
+            self.size += len(body)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self.size -= len(self._entries.popitem(last=False)[1][2])
+
+    def get(self, request):
+        key = self._key(request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[3] > self.max_age:
+                del self._entries[key]
+                self.size -= len(entry[2])
+                return None
+            self._entries.move_to_end(key)
+        status, headers, body = entry[:3]
+        return httpx.Response(status, headers=headers, content=body)
+
+    def invalidate(self, table):
+        """Drop the remembered reads of ``table`` and the tables depending on it ("rpc": all)"""
+        tables = None if table == 'rpc' else {table, *DEPENDENT_TABLES.get(table, ())}
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if tables is None or entry[4] in tables:
+                    del self._entries[key]
+                    self.size -= len(entry[2])
+
+
+class _Resilience:
+    """Retry, breaker and cache decisions shared by the sync and async transports"""
+
+    def __init__(self, pool, breaker, cache=None, retries=RETRIES):
+        self.pool = pool
+        self.breaker = breaker
+        self.cache = cache
+        self.retries = retries
+        self.in_flight = 0
+        self.retried = 0       # retry attempts
+        self.stale_reads = 0   # answers served from the cache
+        self.rejected = 0      # calls failed fast by the open breaker
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @contextmanager
+    def _tracking(self, request):
+        """Count the call as in flight and settle the breaker if it ends with an unexpected exception"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        except httpx.TransportError:
+            raise   # counted as a failure by the caller
+        except BaseException:
+            self.breaker.release()
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            if self.cache is not None and request.method not in IDEMPOTENT:
+                # Whatever the outcome, the write may have changed what was remembered
+                self.cache.invalidate(_table(request))
+
+    def _cacheable(self, request):
+        return self.cache is not None and request.method in IDEMPOTENT and _stale_reads.get() is not None
+
+    def _should_retry(self, request, attempt, error):
+        if attempt >= self.retries:
+            return False
+        if request.method not in IDEMPOTENT and not isinstance(error, NOT_SENT):
+            return False
+        if not self.breaker.allow():
+            return False
+        self._count('retried')
+        return True
+
+    @staticmethod
+    def _backoff(attempt):
+        # Full jitter spreads out the retries of concurrent callers
+        return random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt))
+
+    def _buffered(self, request, response, body):
+        """Rebuild a response around its already-read body, remembering it for stale reads"""
+        if 200 <= response.status_code < 300:
+            self.cache.put(request, response, body)
+        return httpx.Response(response.status_code, headers=response.headers, content=body,
+                              extensions=response.extensions)
+
+    def _fallback(self, request, message):
+        """A stale answer for ``request``, or BackendUnavailable"""
+        if self._cacheable(request):
+            response = self.cache.get(request)
+            if response is not None:
+                self._count('stale_reads')
+                _stale_reads.get().served = True
+                return response
+        raise BackendUnavailable(message, retry_after=self.breaker.retry_after() or None)
+
+    def _rejected(self, request):
+        self._count('rejected')
+        return self._fallback(request, 'Supabase is unavailable (circuit breaker open)')
+
+    def connections(self):
+        # httpx does not expose its httpcore pool publicly
+        return len(self.pool._pool.connections)
+
+
+class ResilientTransport(_Resilience, httpx.BaseTransport):
+    def handle_request(self, request):
+        if not self.breaker.allow():
+            return self._rejected(request)
+        attempt = 0
+        while True:
+            error = response = None
+            try:
+                with self._tracking(request):
+                    response = self.pool.handle_request(request)
+                    if self._cacheable(request):
+                        try:
+                            body = b''.join(response.iter_raw())
+                        finally:
+                            response.close()
+                        response = self._buffered(request, response, body)
+            except httpx.TransportError as e:
+                error = e
+            if error is None and response.status_code not in RETRY_STATUSES:
+                self.breaker.success()
+                return response
+            self.breaker.failure()
+            if response is not None:
+                response.close()
+            if not self._should_retry(request, attempt, error):
+                return self._fallback(request, f'Supabase request failed: {error or response.status_code}')
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def close(self):
+        self.pool.close()
+
+
+class AsyncResilientTransport(_Resilience, httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request):
+        if not self.breaker.allow():
+            return self._rejected(request)
+        attempt = 0
+        while True:
+            error = response = None
+            try:
+                with self._tracking(request):
+                    response = await self.pool.handle_async_request(request)
+                    if self._cacheable(request):
+                        try:
+                            body = b''.join([chunk async for chunk in response.aiter_raw()])
+                        finally:
+                            await response.aclose()
+                        response = self._buffered(request, response, body)
+            except httpx.TransportError as e:
+                error = e
+            if error is None and response.status_code not in RETRY_STATUSES:
+                self.breaker.success()
+                return response
+            self.breaker.failure()
+            if response is not None:
+                await response.aclose()
+            if not self._should_retry(request, attempt, error):
+                return self._fallback(request, f'Supabase request failed: {error or response.status_code}')
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def aclose(self):
+        await self.pool.aclose()
+
+
+def _env(name, default, cast=float):
+    value = os.environ.get(name)
+    return cast(value) if value else default
+
+
+# Shared by every installed transport; set by the first install()
+breaker = None
+cache = None
+transports = {}   # 'sync' / 'async' -> transport
+
+
+def install(client, kind='sync'):
+    """Replace the httpx session of a PostgREST ``client`` with a resilient one.
+
+    Settings come from SUPABASE_POOL_SIZE, SUPABASE_TIMEOUT,
+    SUPABASE_CONNECT_TIMEOUT, SUPABASE_RETRIES, SUPABASE_BREAKER_THRESHOLD,
+    SUPABASE_BREAKER_RESET, SUPABASE_STALE_CACHE_SIZE (0 disables stale
+    reads) and SUPABASE_STALE_MAX_AGE.
+    """
+    global breaker, cache
+    if breaker is None:
+        breaker = CircuitBreaker(_env('SUPABASE_BREAKER_THRESHOLD', BREAKER_THRESHOLD, int),
+                                 _env('SUPABASE_BREAKER_RESET', BREAKER_RESET))
+        stale_entries = _env('SUPABASE_STALE_CACHE_SIZE', STALE_CACHE_SIZE, int)
+        if stale_entries > 0:
+            cache = StaleCache(stale_entries, max_age=_env('SUPABASE_STALE_MAX_AGE', STALE_MAX_AGE))
+        _register_metrics()
+
+    pool_size = _env('SUPABASE_POOL_SIZE', POOL_SIZE, int)
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    timeout = httpx.Timeout(_env('SUPABASE_TIMEOUT', TIMEOUT),
+                            connect=_env('SUPABASE_CONNECT_TIMEOUT', CONNECT_TIMEOUT))
+    http2 = importlib.util.find_spec('h2') is not None
+    retries = _env('SUPABASE_RETRIES', RETRIES, int)
+
+    old = client.session
+    if kind == 'async':
+        transport = AsyncResilientTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2),
+                                            breaker, cache, retries)
+        client.session = httpx.AsyncClient(base_url=old.base_url, headers=old.headers,
+                                           timeout=timeout, transport=transport)
+    else:
+        transport = ResilientTransport(httpx.HTTPTransport(limits=limits, http2=http2),
+                                       breaker, cache, retries)
+        client.session = type(old)(base_url=old.base_url, headers=old.headers,
+                                   timeout=timeout, transport=transport)
+        old.close()
+    transport.pool_size = pool_size
+    transports[kind] = transport
+    return client
+
+
+def _register_metrics():
+    registry.gauge('supabase_breaker_state', lambda: CircuitBreaker.STATES.index(breaker.state),
+                   'Supabase circuit breaker state (0 closed, 1 half-open, 2 open)')
+    registry.counter('supabase_breaker_opened_total', lambda: breaker.opened,
+                   'Times the Supabase circuit breaker opened')
+    registry.gauge('supabase_stale_cache_entries', lambda: len(cache),
+                   'Supabase reads remembered for serving while the backend is down')
+    # Sampled lazily: a client that was never installed raises and is skipped
+    for kind in ('sync', 'async'):
+        def stat(name, kind=kind):
+            return lambda: getattr(transports[kind], name)
+        registry.gauge('supabase_pool_in_flight', stat('in_flight'),
+                       'Supabase requests being sent or awaiting an answer', client=kind)
+        registry.gauge('supabase_pool_size', stat('pool_size'),
+                       'Maximum Supabase connections', client=kind)
+        registry.gauge('supabase_pool_connections', lambda kind=kind: transports[kind].connections(),
+                       'Open Supabase connections, idle or busy', client=kind)
+        registry.counter('supabase_retries_total', stat('retried'),
+                       'Supabase requests retried after a failure', client=kind)
+        registry.counter('supabase_stale_reads_total', stat('stale_reads'),
+                       'Supabase reads answered from the stale cache', client=kind)
+        registry.counter('supabase_rejected_total', stat('rejected'),
+                       'Supabase calls failed fast by the open circuit breaker', client=kind)
@@ -0,0 +1,276 @@
+"""Write-behind buffer for note updates.
+
+Autosave sends a full PUT every couple of seconds while someone types, and
+almost every one of those writes is superseded by the next. With
+``NOTES_WRITE_BEHIND=1`` updates of existing notes are acknowledged from
+memory instead: ``Note.save`` hands the note to the module-level ``buffer``,
+which keeps only the latest state per note and writes everything pending
+with a single update every ``NOTES_WRITE_BEHIND_INTERVAL`` seconds, or
+sooner when more than ``NOTES_WRITE_BEHIND_MAX_PENDING`` notes or
+``NOTES_WRITE_BEHIND_MAX_BYTES`` of text are waiting. The buffer is flushed
+at interpreter exit.
+
+Reads through ``Note`` see buffered state: search, tag and event queries
+apply their filter to pending notes in memory as well. Deletes drop pending
+updates, and creates are always written immediately (they need a database
+id). Flushes only UPDATE existing rows, so a note deleted in the meantime is
+not written back.
+
+The buffer lives in one process. Other workers or servers read the database
+and see a buffered update only after it is flushed, so enable it for a
+single process, or where a few seconds of stale reads elsewhere are fine.
+
+Set ``NOTES_WRITE_BEHIND_WAL`` to a file path to also append every buffered
+update to a JSON-lines log; entries left there by a crash are replayed at
+the next start. Without it, updates acknowledged in the last interval are
+lost if the process dies.
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+from datetime import datetime
+
+from src.metrics import registry
+
+FLUSH_INTERVAL = 5.0
+MAX_PENDING = 1000
+MAX_BYTES = 8 * 1024 * 1024
+
+
+def _size(note):
+    return len(note.title or '') + len(note.content or '')
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING,
+                 max_bytes=MAX_BYTES, wal_path=None):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.wal_path = wal_path
+        self.pending = {}    # note id -> latest Note
+        self.flushing = {}   # note id -> Note being written by the running flush
+        self.pending_bytes = 0
+        self.writes = 0      # updates accepted
+        self.flushed = 0     # notes written to the database
+        self._lock = threading.Lock()
+        # Held for the duration of a flush so deletes cannot race its update
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._wal = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    # -- writes ------------------------------------------------------------
+
+    def put(self, note):
+        """Buffer the new state of an existing note, replacing any pending one"""
+        note.updated_at = datetime.utcnow().isoformat()
+        entry = copy.copy(note)
+        with self._lock:
+            previous = self.pending.get(note.id)
+            if previous is not None:
+                self.pending_bytes -= _size(previous)
+            self.pending[note.id] = entry
+            self.pending_bytes += _size(entry)
+            self.writes += 1
+            self._log(entry)
+            pressure = len(self.pending) >= self.max_pending or self.pending_bytes >= self.max_bytes
+        if pressure:
+            self._wake.set()
+        return note
+
+    def discard(self, note_id):
+        """Drop a pending update, waiting for an in-flight flush that may include it"""
+        with self._flush_lock:
+            with self._lock:
+                entry = self.pending.pop(note_id, None)
+                if entry is not None:
+                    self.pending_bytes -= _size(entry)
+
+    def set_order(self, note_id, order):
+        """Apply an order already written to the database to a pending update"""
+        with self._lock:
+            for entry in (self.pending.get(note_id), self.flushing.get(note_id)):
+                if entry is not None:
+                    entry.order = order
+                    if entry._stored is not None:
+                        entry._stored = dict(entry._stored, order=order)
+
+    # -- reads -------------------------------------------------------------
+
+    def _visible(self):
+        """note id -> buffered state, including notes a running flush has not written yet"""
+        with self._lock:
+            if not self.flushing:
+                return dict(self.pending)
+            return {**self.flushing, **self.pending}
+
+    def get(self, note_id, user_id=None):
+        with self._lock:
+            entry = self.pending.get(note_id) or self.flushing.get(note_id)
+        if entry is None or entry.user_id != user_id:
+            return None
+        return copy.copy(entry)
+
+    def overlay(self, notes):
+        """Replace notes that have a pending update with their buffered state"""
+        pending = self._visible()
+        if not pending:
+            return notes
+        return [copy.copy(pending[note.id]) if note.id in pending else note for note in notes]
+
+    def merge(self, notes, user_id, matches):
+        """Overlay the result of a filtered query, applying its filter ``matches`` to buffered state.
+
+        Notes whose pending update no longer matches are dropped and pending
+        notes of ``user_id`` that now match are added; callers sort again.
+        """
+        pending = self._visible()
+        if not pending:
+            return notes
+        merged = [note for note in self.overlay(notes) if note.id not in pending or matches(note)]
+        seen = {note.id for note in merged}
+        merged += [copy.copy(entry) for entry in pending.values()
+                   if entry.id not in seen and entry.user_id == user_id and matches(entry)]
+        return merged
+
+    def pending_for(self, user_id=None):
+        """Buffered notes of ``user_id``"""
+        return [copy.copy(entry) for entry in self._visible().values() if entry.user_id == user_id]
+
+    # -- flushing ----------------------------------------------------------
+
+    def flush(self):
+        """Write all pending updates with one update; returns the number written"""
+        from src.models.note import Note
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return 0
+                # Readers keep seeing these until the write has returned
+                pending, self.pending, self.pending_bytes = self.pending, {}, 0
+                self.flushing = pending
+                flushing_wal = self._rotate_wal()
+            try:
+                # Subscribers were notified when the update was buffered
+                Note.update_many(list(pending.values()), publish=False, from_buffer=True)
+            except Exception as e:
+                with self._lock:
+                    for note_id, entry in pending.items():
+                        if note_id not in self.pending:
+                            self.pending[note_id] = entry
+                            self.pending_bytes += _size(entry)
+                            self._log(entry)
+                print(f"✗ Write-behind flush of {len(pending)} notes failed, will retry: {e}")
+                return 0
+            finally:
+                with self._lock:
+                    self.flushing = {}
+                if flushing_wal:
+                    os.remove(flushing_wal)
+            with self._lock:
+                self.flushed += len(pending)
+            return len(pending)
+
+    def start(self):
+        self._open_wal()
+        self._thread = threading.Thread(target=self._run, name='notes-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still pending"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._stopped.is_set():
+                self.flush()
+
+    # -- write-ahead log ---------------------------------------------------
+
+    def _open_wal(self):
+        if not self.wal_path:
+            return
+        from src.models.note import Note
+        flushing = self.wal_path + '.flushing'
+        for path in (flushing, self.wal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        note = Note(**json.loads(line))
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    # Unknown previous state, so the flush records a revision
+                    note._stored = None
+                    self.pending[note.id] = note
+        self.pending_bytes = sum(_size(note) for note in self.pending.values())
+        # Compact what was replayed into a fresh log before dropping the old ones
+        compacted = self.wal_path + '.tmp'
+        with open(compacted, 'w') as f:
+            for note in self.pending.values():
+                f.write(json.dumps(note.to_dict()) + '\n')
+        os.replace(compacted, self.wal_path)
+        if os.path.exists(flushing):
+            os.remove(flushing)
+        self._wal = open(self.wal_path, 'a')
+        if self.pending:
+            print(f"✓ Replayed {len(self.pending)} buffered note updates from {self.wal_path}")
+
+    def _log(self, note):
+        if self._wal is not None:
+            self._wal.write(json.dumps(note.to_dict()) + '\n')
+            self._wal.flush()
+
+    def _rotate_wal(self):
+        """Move the log aside for the duration of a flush, returning its new path"""
+        if self._wal is None:
+            return None
+        self._wal.close()
+        flushing = self.wal_path + '.flushing'
+        os.replace(self.wal_path, flushing)
+        self._wal = open(self.wal_path, 'a')
+        return flushing
+
+
+# Set by configure_from_env() when write-behind is enabled
+buffer = None
+
+
+def configure_from_env():
+    """Enable the write-behind buffer when NOTES_WRITE_BEHIND is set"""
+    global buffer
+    if os.environ.get('NOTES_WRITE_BEHIND', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    buffer = WriteBehindBuffer(
+        flush_interval=float(os.environ.get('NOTES_WRITE_BEHIND_INTERVAL', FLUSH_INTERVAL)),
+        max_pending=int(os.environ.get('NOTES_WRITE_BEHIND_MAX_PENDING', MAX_PENDING)),
+        max_bytes=int(os.environ.get('NOTES_WRITE_BEHIND_MAX_BYTES', MAX_BYTES)),
+        wal_path=os.environ.get('NOTES_WRITE_BEHIND_WAL') or None,
+    )
+    buffer.start()
+    registry.gauge('notes_write_behind_pending', lambda: len(buffer),
+                   'Note updates waiting to be flushed')
+    registry.counter('notes_write_behind_writes_total', lambda: buffer.writes,
+                   'Note updates accepted by the write-behind buffer')
+    registry.counter('notes_write_behind_flushed_total', lambda: buffer.flushed,
+                   'Notes written to the database by write-behind flushes')
+    print(f"✓ Write-behind buffer enabled (flush every {buffer.flush_interval:g}s)")
+    return buffer
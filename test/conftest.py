@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_postgrest import FakePostgrest, serve
+from bench.run import BENCH_KEY
+
+
+@pytest.fixture(scope='session')
+def fake():
+    """The PostgREST stand-in from bench/, shared by the whole session"""
+    fake = FakePostgrest()
+    backend = serve(fake)
+    # The app reads its configuration at import time
+    os.environ['SUPABASE_URL'] = f'http://127.0.0.1:{backend.server_port}'
+    os.environ['SUPABASE_ANON_KEY'] = BENCH_KEY
+    os.environ.setdefault('GITHUB_TOKEN', 'test')
+    yield fake
+    backend.shutdown()
+
+
+@pytest.fixture
+def client(fake):
+    from src.main import app
+    fake.reset()
+    return app.test_client()
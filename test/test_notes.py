@@ -0,0 +1,82 @@
+import pytest
+
+
+def create_note(client, **fields):
+    response = client.post('/api/notes', json={'title': 'Note', 'content': 'text', **fields})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+@pytest.mark.parametrize('tags, expected', [
+    ('2024', ['2024']),
+    ('true', ['true']),
+    ('null', []),
+    (5, ['5']),
+    (None, []),
+    ('["work", null, "home"]', ['work', 'home']),
+    ('work, home', ['work', 'home']),
+])
+def test_update_with_scalar_and_null_tags(client, tags, expected):
+    note = create_note(client)
+    response = client.put(f"/api/notes/{note['id']}", json={'title': 'Note', 'content': 'text', 'tags': tags})
+    assert response.status_code == 200
+    assert response.get_json()['tags'] == expected
+
+
+def test_list_reads_rows_with_scalar_tags(client, fake):
+    note = create_note(client)
+    with fake.lock:
+        fake.conn.execute('UPDATE notes SET tags = ? WHERE id = ?', ('7', note['id']))
+        fake.conn.commit()
+    response = client.get('/api/notes')
+    assert response.status_code == 200
+    assert response.get_json()[0]['tags'] == ['7']
+
+
+def test_changes_since_token(client):
+    first = create_note(client, title='First')
+    changes = client.get('/api/notes/changes').get_json()
+    assert changes['full'] and [note['id'] for note in changes['notes']] == [first['id']]
+
+    second = create_note(client, title='Second')
+    client.delete(f"/api/notes/{first['id']}")
+    changes = client.get(f"/api/notes/changes?since={changes['sync_token']}").get_json()
+    assert not changes['full']
+    assert [note['id'] for note in changes['notes']] == [second['id']]
+    assert changes['deleted'] == [first['id']]
+
+    changes = client.get(f"/api/notes/changes?since={changes['sync_token']}").get_json()
+    assert changes['notes'] == [] and changes['deleted'] == []
+
+
+def test_batch_rejects_invalid_references_per_operation(client):
+    note = create_note(client)
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'create', 'ref': 'tmp-1', 'note': {'title': 'New', 'content': 'text'}},
+        {'op': 'patch', 'id': [1], 'note': {'title': 'x'}},
+        {'op': 'delete', 'id': {'id': 1}},
+        {'op': 'reorder', 'order': [note['id'], [1]]},
+        {'op': 'create', 'ref': ['tmp-2'], 'note': {'title': 'New', 'content': 'text'}},
+        {'op': 'patch', 'id': {'ref': 'tmp-1'}, 'note': {'title': 'Renamed'}},
+        {'op': 'reorder', 'order': [{'ref': 'tmp-1'}, note['id']]},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == [201, 400, 400, 400, 400, 200, 200]
+    assert results[0]['note']['title'] == 'Renamed'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('a,b', ['a,b (draft)']),
+    ('(draft)', ['a,b (draft)']),
+    ('"hi"', ['say "hi" \\ now']),
+    ('\\', ['say "hi" \\ now']),
+    ('100%', ['100% done']),
+    ('_', []),
+])
+def test_search_with_punctuation(client, query, expected):
+    for title in ('a,b (draft)', 'say "hi" \\ now', '100% done', '1000 done'):
+        create_note(client, title=title)
+    response = client.get('/api/notes/search', query_string={'q': query})
+    assert response.status_code == 200
+    assert [note['title'] for note in response.get_json()] == expected